@@ -1,10 +1,25 @@
 import streamlit as st
+import io
 import os
+import threading
+from functools import lru_cache
 from pathlib import Path
-from dotenv import load_dotenv
+from dotenv import dotenv_values, load_dotenv
 
-# Load environment variables
-load_dotenv()
+ENV_PATH = Path(".env")
+
+def _env_mtime_ns():
+    """Modification time of .env in nanoseconds, or 0 if there is no .env yet."""
+    try:
+        return ENV_PATH.stat().st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+# Load environment variables, skipping the reparse on reruns where .env hasn't changed
+_env_mtime = _env_mtime_ns()
+if st.session_state.get("_env_mtime") != _env_mtime:
+    load_dotenv()
+    st.session_state["_env_mtime"] = _env_mtime
 
 # Set page configuration
 st.set_page_config(
@@ -14,8 +29,21 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Providers and their corresponding environment variable names
+PROVIDERS = {
+    "OpenAI": "OPENAI_API_KEY",
+    "Anthropic": "ANTHROPIC_API_KEY",
+    "Gemini": "GEMINI_API_KEY",
+    "OpenRouter": "OPENROUTER_API_KEY"
+}
+PROVIDER_NAMES = tuple(PROVIDERS)
+# Value each provider is stored under in PRIMARY_CAMEL_PROVIDER
+PROVIDER_ENV_TAGS = {name: name.upper().replace(" ", "_") for name in PROVIDERS}
+# Keys the Save handler writes in a fixed order; anything else in .env is carried over after them
+_KNOWN_ENV_KEYS = frozenset(PROVIDERS.values()) | {"PRIMARY_CAMEL_PROVIDER"}
+
 # Enhanced Custom CSS
-st.markdown("""
+_CSS = """
     <style>
     .main {
         padding: 1rem 2rem;
@@ -93,82 +121,97 @@ st.markdown("""
         margin: 1rem 0;
     }
     </style>
-""", unsafe_allow_html=True)
+"""
+# Streamlit drops elements that aren't re-emitted on a rerun, so the style
+# block has to be written every run; keeping it a constant avoids rebuilding it.
+st.markdown(_CSS, unsafe_allow_html=True)
 
-def main():
-    # Compact header
-    st.markdown('<h1 class="compact-title">🐫 CAMEL AI Playground</h1>', unsafe_allow_html=True)
-    st.markdown('<p class="compact-subtitle">Experiment with autonomous and communicative AI agents</p>', unsafe_allow_html=True)
+def _count_json(dir_name):
+    """Count the .json and .json.gz files directly inside dir_name (0 if it doesn't exist)."""
+    try:
+        with os.scandir(dir_name) as entries:
+            return sum(
+                1 for e in entries
+                if e.name.endswith((".json", ".json.gz")) and e.is_file(follow_symlinks=False)
+            )
+    except FileNotFoundError:
+        return 0
 
-    # Sidebar configuration (keeping the existing API key management)
-    st.sidebar.title("⚙️ Configuration")
-    
-    # API Key Management
-    with st.sidebar.expander("🔑 API Key Management", expanded=True):
-        # Define providers and their corresponding environment variable names
-        providers = {
-            "OpenAI": "OPENAI_API_KEY",
-            "Anthropic": "ANTHROPIC_API_KEY",
-            "Gemini": "GEMINI_API_KEY",
-            "OpenRouter": "OPENROUTER_API_KEY"
-        }
-        provider_names = list(providers.keys())
-
-        # Helper to get index of primary provider or default to 0
-        def get_primary_provider_index():
-            primary_provider_name = os.getenv("PRIMARY_CAMEL_PROVIDER")
-            if primary_provider_name:
-                try:
-                    return provider_names.index(primary_provider_name.replace("_API_KEY","").replace("_"," ").title().replace("Ai","AI").replace("Api","API"))
-                except ValueError:
-                    # If PRIMARY_CAMEL_PROVIDER is set to a value not in our list (e.g. "OPENAI"), try to match it.
-                    # This is a bit of a heuristic and might need refinement based on actual env var values.
-                    for i, name in enumerate(provider_names):
-                        if primary_provider_name.startswith(name.upper()):
-                            return i
-            return 0
-
-        if 'selected_provider_index' not in st.session_state:
-            st.session_state.selected_provider_index = get_primary_provider_index()
+@st.cache_data(ttl=30, show_spinner=False)
+def _history_counts():
+    """Return (conversations, role plays, tasks) saved-history file counts."""
+    return (
+        _count_json("conversation_history"),
+        _count_json("role_play_history"),
+        _count_json("task_history"),
+    )
+
+# Serializes background .env writes so back-to-back saves land in order
+_ENV_WRITE_LOCK = threading.Lock()
 
+def _write_env_file(content):
+    with _ENV_WRITE_LOCK:
+        ENV_PATH.write_text(content)
+        load_dotenv(override=True)
+
+@st.cache_data(max_entries=1, show_spinner=False)
+def _load_env_dict(mtime_ns):
+    """Parse .env; keyed on its mtime so an unchanged file is never reparsed."""
+    if not mtime_ns:
+        return {}
+    # Keys without a value come back as None
+    return {k: v for k, v in dotenv_values(ENV_PATH).items() if v is not None}
+
+@lru_cache(maxsize=16)
+def _primary_provider_index(primary_provider_name):
+    """Index into PROVIDER_NAMES of the PRIMARY_CAMEL_PROVIDER value, or 0."""
+    if primary_provider_name:
+        try:
+            return PROVIDER_NAMES.index(primary_provider_name.replace("_API_KEY","").replace("_"," ").title().replace("Ai","AI").replace("Api","API"))
+        except ValueError:
+            # If PRIMARY_CAMEL_PROVIDER is set to a value not in our list (e.g. "OPENAI"), try to match it.
+            # This is a bit of a heuristic and might need refinement based on actual env var values.
+            for i, name in enumerate(PROVIDER_NAMES):
+                if primary_provider_name.startswith(name.upper()):
+                    return i
+    return 0
+
+@st.fragment
+def _api_key_manager(env_snapshot, primary_provider_env_val):
+    with st.expander("🔑 API Key Management", expanded=True):
+        # The selectbox keeps its own state under its key; seed it from the primary provider once
+        st.session_state.setdefault(
+            "selected_api_provider_selectbox",
+            PROVIDER_NAMES[_primary_provider_index(primary_provider_env_val)]
+        )
         selected_provider_name = st.selectbox(
             "Select API Provider",
-            provider_names,
-            index=st.session_state.selected_provider_index,
+            PROVIDER_NAMES,
             key="selected_api_provider_selectbox"
         )
-        
-        # Update session state if selectbox changes
-        if provider_names[st.session_state.selected_provider_index] != selected_provider_name:
-            st.session_state.selected_provider_index = provider_names.index(selected_provider_name)
 
-        selected_env_var_name = providers[selected_provider_name]
+        selected_env_var_name = PROVIDERS[selected_provider_name]
         
-        current_api_key = st.text_input(
-            f"{selected_provider_name} API Key",
-            type="password",
-            value=os.getenv(selected_env_var_name, ""),
-            key=f"{selected_provider_name.lower()}_api_key_input",
-            help=f"Enter your {selected_provider_name} API key"
-        )
+        # The key field sits in a form so typing/pasting a key doesn't rerun until Save is pressed.
+        # The selectbox stays outside it: the field's label and widget key follow the selected provider.
+        with st.form("api_key_form", border=False):
+            current_api_key = st.text_input(
+                f"{selected_provider_name} API Key",
+                type="password",
+                value=env_snapshot[selected_provider_name],
+                key=f"{selected_provider_name.lower()}_api_key_input",
+                help=f"Enter your {selected_provider_name} API key"
+            )
+            save_clicked = st.form_submit_button(f"💾 Save {selected_provider_name} Key")
         
-        if st.button(f"💾 Save {selected_provider_name} Key"):
-            env_path = Path('.env')
-            
-            existing_env = {}
-            if env_path.exists():
-                with open(env_path, 'r') as f:
-                    for line in f:
-                        line = line.strip()
-                        if '=' in line:
-                            key, value = line.split('=', 1)
-                            # Preserve quotes if they exist, otherwise handle normally
-                            if value.startswith('"') and value.endswith('"'):
-                                existing_env[key] = value[1:-1]
-                            elif value.startswith("'") and value.endswith("'"):
-                                existing_env[key] = value[1:-1]
-                            else:
-                                existing_env[key] = value
+        if save_clicked:
+            # Let any in-flight write finish so we don't rebuild from a stale file
+            pending_writer = st.session_state.get("_env_writer")
+            if pending_writer is not None:
+                pending_writer.join()
+
+            # dotenv handles quoting, `export` prefixes and comments
+            existing_env = _load_env_dict(_env_mtime_ns())
 
             # Update the specific key for the selected provider
             if current_api_key:
@@ -177,118 +220,148 @@ def main():
                  del existing_env[selected_env_var_name]
 
             # Set the primary provider
-            existing_env["PRIMARY_CAMEL_PROVIDER"] = selected_provider_name.upper().replace(" ", "_")
-
-            # Reconstruct .env content
-            env_content = ""
-            if "PRIMARY_CAMEL_PROVIDER" in existing_env:
-                 env_content += f'PRIMARY_CAMEL_PROVIDER="{existing_env["PRIMARY_CAMEL_PROVIDER"]}"\n'
-            
-            for p_name, env_var in providers.items():
+            existing_env["PRIMARY_CAMEL_PROVIDER"] = PROVIDER_ENV_TAGS[selected_provider_name]
+
+            # Reconstruct .env content: primary provider first, then provider keys, then any other keys
+            env_content = io.StringIO()
+            env_content.write(f'PRIMARY_CAMEL_PROVIDER="{existing_env["PRIMARY_CAMEL_PROVIDER"]}"\n')
+            for env_var in PROVIDERS.values():
                 if env_var in existing_env:
-                    env_content += f'{env_var}="{existing_env[env_var]}"\n'
-            
-            # Add any other keys
-            other_known_vars = list(providers.values()) + ["PRIMARY_CAMEL_PROVIDER"]
+                    env_content.write(f'{env_var}="{existing_env[env_var]}"\n')
             for key, value in existing_env.items():
-                if key not in other_known_vars:
-                    env_content += f'{key}="{value}"\n'
+                if key not in _KNOWN_ENV_KEYS:
+                    env_content.write(f'{key}="{value}"\n')
 
-            env_path.write_text(env_content.strip())
-            load_dotenv(override=True)
-            st.session_state.selected_provider_index = provider_names.index(selected_provider_name)
-            st.success(f"✅ {selected_provider_name} API key saved!")
-            st.rerun()
+            # Nothing to write (or reload and rerun for) if the file already says exactly this
+            new_content = env_content.getvalue().strip()
+            try:
+                unchanged = ENV_PATH.read_text().strip() == new_content
+            except FileNotFoundError:
+                unchanged = False
 
-    # Compact API Key Status
-    st.sidebar.markdown("### 📊 API Status")
-    primary_provider_env_val = os.getenv("PRIMARY_CAMEL_PROVIDER")
+            if unchanged:
+                st.toast(f"✅ {selected_provider_name} API key already saved")
+            else:
+                # Show the new status right away; the disk write and dotenv reload happen in the background
+                st.session_state.setdefault("_optimistic_env", {}).update({
+                    selected_env_var_name: current_api_key,
+                    "PRIMARY_CAMEL_PROVIDER": existing_env["PRIMARY_CAMEL_PROVIDER"],
+                })
+                writer = threading.Thread(target=_write_env_file, args=(new_content,))
+                writer.start()
+                st.session_state["_env_writer"] = writer
 
-    for provider_name, env_var_name in providers.items():
-        is_set = bool(os.getenv(env_var_name))
-        if is_set:
-            icon = "✅" if primary_provider_env_val and provider_name.upper().replace(" ", "_") == primary_provider_env_val else "✔️"
-            st.sidebar.success(f"{icon} {provider_name}")
-        else:
-            icon = "🚨" if primary_provider_env_val and provider_name.upper().replace(" ", "_") == primary_provider_env_val else "⚠️"
-            st.sidebar.warning(f"{icon} {provider_name}")
-
-    # Quick Start Guide (Compact)
-    with st.expander("🚀 Quick Start", expanded=False):
-        st.markdown("""
-        **Ready in 3 steps:**
-        1. 🔑 Configure API keys in the sidebar
-        2. 🎯 Choose a feature below to get started
-        3. 🚀 Start experimenting with AI agents!
-        
-        **Need help?** Check out our [Setup Guide](SETUP_GUIDE.md) or [Repository Index](REPOSITORY_INDEX.md)
-        """)
+                st.toast(f"✅ {selected_provider_name} API key saved!")
+                st.rerun()
 
-    # Main Feature Cards - Prominently displayed
-    st.markdown("## 🎯 Choose Your Adventure")
-    
-    # Create 2x2 grid for feature cards
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        # Chat Agents Card
-        st.markdown("""
+# Feature cards per grid column: (card HTML, button label, button key, target page)
+FEATURE_CARD_COLUMNS = (
+    (
+        ("""
         <div class="feature-card chat-card">
             <h4>💬 Chat Agents</h4>
             <p>Create and interact with AI agents using custom roles and personalities</p>
         </div>
-        """, unsafe_allow_html=True)
-        if st.button("🚀 Start Chatting", key="chat_btn"):
-            st.switch_page("pages/01_Chat_Agents.py")
-            
-        # Task Automation Card
-        st.markdown("""
+        """, "🚀 Start Chatting", "chat_btn", "pages/01_Chat_Agents.py"),
+        ("""
         <div class="feature-card task-card">
             <h4>🎯 Task Automation</h4>
             <p>Set up autonomous task completion with progress tracking</p>
         </div>
-        """, unsafe_allow_html=True)
-        if st.button("⚡ Automate Tasks", key="task_btn"):
-            st.switch_page("pages/03_Task_Automation.py")
-
-    with col2:
-        # Role Playing Card
-        st.markdown("""
+        """, "⚡ Automate Tasks", "task_btn", "pages/03_Task_Automation.py"),
+    ),
+    (
+        ("""
         <div class="feature-card role-card">
             <h4>🎭 Role Playing</h4>
             <p>Create scenarios with multiple agents in different roles</p>
         </div>
-        """, unsafe_allow_html=True)
-        if st.button("🎪 Start Role Play", key="role_btn"):
-            st.switch_page("pages/02_Role_Playing.py")
-            
-        # Visualization Card
-        st.markdown("""
+        """, "🎪 Start Role Play", "role_btn", "pages/02_Role_Playing.py"),
+        ("""
         <div class="feature-card viz-card">
             <h4>📊 Visualization</h4>
             <p>Analyze and visualize your agent interactions and performance</p>
         </div>
-        """, unsafe_allow_html=True)
-        if st.button("📈 View Analytics", key="viz_btn"):
-            st.switch_page("pages/04_Visualization.py")
+        """, "📈 View Analytics", "viz_btn", "pages/04_Visualization.py"),
+    ),
+)
 
-    # Stats Summary (if there's data)
-    col1, col2, col3, col4 = st.columns(4)
+@st.fragment
+def _feature_grid():
+    st.markdown("## 🎯 Choose Your Adventure")
     
-    # Check for existing data
-    conv_count = len(list(Path("conversation_history").glob("*.json"))) if Path("conversation_history").exists() else 0
-    role_count = len(list(Path("role_play_history").glob("*.json"))) if Path("role_play_history").exists() else 0
-    task_count = len(list(Path("task_history").glob("*.json"))) if Path("task_history").exists() else 0
+    # Create 2x2 grid for feature cards; each card keeps its button directly beneath it
+    for col, cards in zip(st.columns(2), FEATURE_CARD_COLUMNS):
+        with col:
+            for card_html, button_label, button_key, page in cards:
+                st.markdown(card_html, unsafe_allow_html=True)
+                if st.button(button_label, key=button_key):
+                    st.switch_page(page)
+
+METRIC_LABELS = ("💬 Conversations", "🎭 Role Plays", "🎯 Tasks", "🔑 APIs Ready")
+
+@st.fragment
+def _stats_row(api_count):
+    # Existing data counts are cached briefly so widget reruns don't rescan the directories
+    values = (*_history_counts(), f"{api_count}/{len(PROVIDERS)}")
+    for col, label, value in zip(st.columns(4), METRIC_LABELS, values):
+        col.metric(label, value)
+
+def main():
+    # Once a background save has landed, os.environ is current again
+    writer = st.session_state.get("_env_writer")
+    if writer is not None and not writer.is_alive():
+        del st.session_state["_env_writer"]
+        st.session_state.pop("_optimistic_env", None)
+    optimistic_env = st.session_state.get("_optimistic_env", {})
+
+    # Snapshot the provider environment once per run, preferring values from a save still being written
+    env_snapshot = {
+        name: optimistic_env.get(env_var, os.environ.get(env_var, ""))
+        for name, env_var in PROVIDERS.items()
+    }
+    primary_provider_env_val = optimistic_env.get("PRIMARY_CAMEL_PROVIDER", os.environ.get("PRIMARY_CAMEL_PROVIDER", ""))
+
+    # Compact header
+    st.markdown('<h1 class="compact-title">🐫 CAMEL AI Playground</h1>', unsafe_allow_html=True)
+    st.markdown('<p class="compact-subtitle">Experiment with autonomous and communicative AI agents</p>', unsafe_allow_html=True)
+
+    # Sidebar configuration (keeping the existing API key management)
+    st.sidebar.title("⚙️ Configuration")
     
-    with col1:
-        st.metric("💬 Conversations", conv_count)
-    with col2:
-        st.metric("🎭 Role Plays", role_count)
-    with col3:
-        st.metric("🎯 Tasks", task_count)
-    with col4:
-        api_count = sum(1 for env_var in providers.values() if os.getenv(env_var))
-        st.metric("🔑 APIs Ready", f"{api_count}/4")
+    # API Key Management (a fragment, so picking a provider only reruns the expander)
+    with st.sidebar:
+        _api_key_manager(env_snapshot, primary_provider_env_val)
+
+    # Compact API Key Status
+    st.sidebar.markdown("### 📊 API Status")
+
+    for provider_name, api_key in env_snapshot.items():
+        is_primary = PROVIDER_ENV_TAGS[provider_name] == primary_provider_env_val
+        if api_key:
+            icon = "✅" if is_primary else "✔️"
+            st.sidebar.success(f"{icon} {provider_name}")
+        else:
+            icon = "🚨" if is_primary else "⚠️"
+            st.sidebar.warning(f"{icon} {provider_name}")
+
+    # Quick Start Guide (Compact)
+    with st.expander("🚀 Quick Start", expanded=False):
+        st.markdown("""
+        **Ready in 3 steps:**
+        1. 🔑 Configure API keys in the sidebar
+        2. 🎯 Choose a feature below to get started
+        3. 🚀 Start experimenting with AI agents!
+        
+        **Need help?** Check out our [Setup Guide](SETUP_GUIDE.md) or [Repository Index](REPOSITORY_INDEX.md)
+        """)
+
+    # Main Feature Cards - Prominently displayed
+    _feature_grid()
+
+    # Stats Summary (if there's data)
+    api_count = sum(1 for api_key in env_snapshot.values() if api_key)
+    _stats_row(api_count)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
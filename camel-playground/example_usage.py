@@ -4,7 +4,9 @@ Example usage of CAMEL AI integration.
 This script demonstrates how to create and use CAMEL AI agents programmatically.
 """
 
+import asyncio
 import os
+from functools import lru_cache
 from dotenv import load_dotenv
 from camel.agents import ChatAgent
 from camel.messages import BaseMessage
@@ -15,6 +17,17 @@ from camel.configs import ChatGPTConfig
 # Load environment variables
 load_dotenv()
 
+@lru_cache(maxsize=1)
+def _get_model(api_key, model_type="gpt-4.1-mini"):
+    """Build the model client once per (api_key, model_type)."""
+    
+    return ModelFactory.create(
+        model_platform=ModelPlatformType.OPENAI,
+        model_type=model_type,  # Defaults to the latest balanced model
+        model_config_dict=ChatGPTConfig(temperature=0.7, max_tokens=1000).as_dict(),
+        api_key=api_key
+    )
+
 def create_simple_agent():
     """Create a simple CAMEL AI agent."""
     
@@ -25,13 +38,8 @@ def create_simple_agent():
         return None
     
     try:
-        # Create model instance
-        model = ModelFactory.create(
-            model_platform=ModelPlatformType.OPENAI,
-            model_type="gpt-4.1-mini",  # Using latest balanced model
-            model_config_dict=ChatGPTConfig(temperature=0.7, max_tokens=1000).as_dict(),
-            api_key=api_key
-        )
+        # Create model instance (cached, so repeat calls reuse the same client)
+        model = _get_model(api_key)
         
         # Create system message
         system_message = BaseMessage.make_assistant_message(
@@ -39,7 +47,7 @@ def create_simple_agent():
             content="You are a helpful Python programming expert. You provide clear, concise, and practical Python code examples and explanations."
         )
         
-        # Create agent
+        # Create a fresh agent so each call starts with an empty memory
         agent = ChatAgent(system_message=system_message, model=model)
         
         print("✅ Agent created successfully!")
@@ -58,15 +66,36 @@ def chat_with_agent(agent, message):
         
         # Get response from agent
         response = agent.step(user_msg)
-        
-        if response and hasattr(response, 'msg') and response.msg:
-            return response.msg.content
-        else:
-            return "No response received from agent."
+        return _response_content(response)
+            
+    except Exception as e:
+        return f"Error getting response: {e}"
+
+async def achat_with_agent(agent, message):
+    """Async version of chat_with_agent, using the agent's astep."""
+    
+    try:
+        user_msg = BaseMessage.make_user_message(role_name="User", content=message)
+        response = await agent.astep(user_msg)
+        return _response_content(response)
             
     except Exception as e:
         return f"Error getting response: {e}"
 
+async def ask_concurrently(agent, questions):
+    """Ask independent questions in parallel, each on a fresh clone of agent.
+    
+    Clones start without memory so the concurrent turns don't interleave in one history.
+    """
+    return await asyncio.gather(
+        *(achat_with_agent(agent.clone(with_memory=False), question) for question in questions)
+    )
+
+def _response_content(response):
+    if response and hasattr(response, 'msg') and response.msg:
+        return response.msg.content
+    return "No response received from agent."
+
 def main():
     """Main function demonstrating CAMEL AI usage."""
     
@@ -88,11 +117,12 @@ def main():
     
     print("\n🤖 Starting conversation with Python Expert agent...\n")
     
-    for i, question in enumerate(examples, 1):
+    # The questions are independent, so send them all at once and print in order
+    responses = asyncio.run(ask_concurrently(agent, examples))
+    
+    for i, (question, response) in enumerate(zip(examples, responses), 1):
         print(f"👤 Question {i}: {question}")
         print("🤖 Agent Response:")
-        
-        response = chat_with_agent(agent, question)
         print(response)
         print("-" * 60)
     
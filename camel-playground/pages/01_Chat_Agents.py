@@ -1,15 +1,20 @@
 import streamlit as st
+import asyncio
+import concurrent.futures
+import hashlib
+import inspect
 import os
-from camel.agents import ChatAgent
-from camel.messages import BaseMessage
-from camel.types import ModelType, ModelPlatformType
-from camel.models import ModelFactory
-from camel.configs import ChatGPTConfig, AnthropicConfig, GeminiConfig
-import plotly.graph_objects as go
 from datetime import datetime
-import json
+import orjson
 from pathlib import Path
 import logging
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Mapping, Optional
+from utils.model_clients import create_model, event_loop, key_fingerprint, shared_http_client, wait_timeout
 
 # Configure basic logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -21,41 +26,115 @@ st.set_page_config(
     layout="wide"
 )
 
+# Providers the page can use, with the env var holding each API key
+PROVIDER_API_KEY_ENV_VARS = (
+    ("OpenAI", "OPENAI_API_KEY"),
+    ("Anthropic", "ANTHROPIC_API_KEY"),
+    ("Gemini", "GEMINI_API_KEY"),
+    ("OpenRouter", "OPENROUTER_API_KEY"),
+)
+
+# Model name input defaults
+DEFAULT_MODEL_FOR_PROVIDER = MappingProxyType({
+    "OpenAI": "gpt-4.1-mini", 
+    "Anthropic": "claude-sonnet-4-20250514",
+    "Gemini": "gemini-2.5-flash-preview-05-20", 
+    "OpenRouter": "google/gemini-flash-1.5"
+})
+
+@st.cache_resource(show_spinner=False)
+def _model_maps():
+    """Per-provider maps of lower-cased model names to a CAMEL ModelType or a normalized name.
+
+    Anything not listed is passed through as typed. Built on first agent creation so the
+    page renders without importing CAMEL; members missing from this CAMEL version fall
+    back to the plain model name.
+    """
+    from camel.types import ModelType
+
+    def model_type(member: str, fallback: str):
+        return getattr(ModelType, member, fallback)
+
+    return {
+        "openai": {
+            "gpt-4o": "gpt-4o",
+            "gpt-4o-mini": "gpt-4o-mini",
+            "gpt-4.1": "gpt-4.1",
+            "gpt-4.1-mini": "gpt-4.1-mini",
+            "o3": "o3",
+            "o4-mini": "o4-mini",
+            "gpt-4": model_type("GPT_4", "gpt-4"),
+            "gpt-3.5-turbo": model_type("GPT_3_5_TURBO", "gpt-3.5-turbo"),
+            "gpt-3.5": model_type("GPT_3_5_TURBO", "gpt-3.5-turbo"),
+        },
+        "anthropic": {
+            "claude-3-5-sonnet-latest": model_type("CLAUDE_3_5_SONNET", "claude-3-5-sonnet-latest"),
+            "claude-3-5-sonnet": model_type("CLAUDE_3_5_SONNET", "claude-3-5-sonnet-latest"),
+            "claude-3-5-haiku": model_type("CLAUDE_3_5_HAIKU", "claude-3-5-haiku-latest"),
+            "claude-2": model_type("CLAUDE_2_1", "claude-2.1"),
+        },
+        "gemini": {
+            "gemini-2.0-flash": model_type("GEMINI_2_0_FLASH", "gemini-2.0-flash"),
+            "gemini-2-0-flash": model_type("GEMINI_2_0_FLASH", "gemini-2.0-flash"),
+            "gemini-1.5-pro": model_type("GEMINI_1_5_PRO", "gemini-1.5-pro"),
+            "gemini-1-5-pro": model_type("GEMINI_1_5_PRO", "gemini-1.5-pro"),
+            "gemini-1.5-flash": model_type("GEMINI_1_5_FLASH", "gemini-1.5-flash"),
+            "gemini-1-5-flash": model_type("GEMINI_1_5_FLASH", "gemini-1.5-flash"),
+        },
+    }
+
+@dataclass(frozen=True)
+class ProviderSpec:
+    """How create_agent builds a model for one provider."""
+    name: str
+    env_var: str
+    platform: Any
+    config_cls: Optional[type]  # None: pass the config dict through unchanged
+    model_map: Mapping[str, Any]
+
+@st.cache_resource(show_spinner=False)
+def _provider_registry():
+    """ProviderSpec per lower-cased provider name, built on first agent creation."""
+    from camel.configs import ChatGPTConfig, AnthropicConfig, GeminiConfig
+    from camel.types import ModelPlatformType
+
+    model_maps = _model_maps()
+    return MappingProxyType({
+        "openai": ProviderSpec("OpenAI", "OPENAI_API_KEY", ModelPlatformType.OPENAI, ChatGPTConfig, model_maps["openai"]),
+        "anthropic": ProviderSpec("Anthropic", "ANTHROPIC_API_KEY", ModelPlatformType.ANTHROPIC, AnthropicConfig, model_maps["anthropic"]),
+        "gemini": ProviderSpec("Gemini", "GEMINI_API_KEY", ModelPlatformType.GEMINI, GeminiConfig, model_maps["gemini"]),
+        "openrouter": ProviderSpec("OpenRouter", "OPENROUTER_API_KEY", ModelPlatformType.OPENROUTER, None, {}),
+    })
+
+@st.cache_resource(show_spinner=False)
+def _agent_stream_kwargs():
+    """ChatAgent kwargs so streamed chunks carry the text so far.
+
+    Newer CAMEL releases default to deltas and need stream_accumulate=True.
+    """
+    from camel.agents import ChatAgent
+    if "stream_accumulate" in inspect.signature(ChatAgent.__init__).parameters:
+        return {"stream_accumulate": True}
+    return {}
+
+# Saved conversations, and where batch re-run results are written
+CONVERSATION_DIR = Path("conversation_history")
+BATCH_RESULTS_DIR = CONVERSATION_DIR / "batch_reruns"
+CONVERSATION_DIR.mkdir(exist_ok=True)
+
+# Providers with a batch endpoint the re-run action can use
+BATCH_PROVIDERS = ("OpenAI", "Anthropic")
+
+# Replies to exact-duplicate turns are served locally for this long, up to this many
+RESPONSE_CACHE_TTL = 3600
+RESPONSE_CACHE_MAX_ENTRIES = 1024
+
 # Enhanced Custom CSS
-st.markdown("""
+_CSS = """
     <style>
     .main {
         padding: 1rem 2rem;
     }
-    .chat-container {
-        background: linear-gradient(135deg, #f5f7fa 0%, #c3cfe2 100%);
-        padding: 1.5rem;
-        border-radius: 15px;
-        margin: 1rem 0;
-        max-height: 600px;
-        overflow-y: auto;
-        border: 1px solid #e1e5e9;
-        box-shadow: 0 4px 15px rgba(0,0,0,0.1);
-    }
-    .message {
-        padding: 1rem;
-        margin: 0.75rem 0;
-        border-radius: 12px;
-        box-shadow: 0 2px 8px rgba(0,0,0,0.1);
-        animation: fadeIn 0.3s ease-in;
-    }
-    .agent-message {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        color: white;
-        margin-left: 1rem;
-        margin-right: 3rem;
-    }
-    .user-message {
-        background: linear-gradient(135deg, #f093fb 0%, #f5576c 100%);
-        color: white;
-        margin-left: 3rem;
-        margin-right: 1rem;
-    }
     .agent-config {
         background: #f8f9fa;
         padding: 1.5rem;
@@ -92,17 +171,6 @@ st.markdown("""
         transform: translateY(-2px);
         box-shadow: 0 4px 12px rgba(0,0,0,0.15);
     }
-    .header-stats {
-        background: white;
-        padding: 1rem;
-        border-radius: 10px;
-        box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-        margin: 1rem 0;
-    }
-    @keyframes fadeIn {
-        from { opacity: 0; transform: translateY(10px); }
-        to { opacity: 1; transform: translateY(0); }
-    }
     .compact-title {
         margin-bottom: 0.5rem;
         background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
@@ -111,7 +179,8 @@ st.markdown("""
         background-clip: text;
     }
     </style>
-""", unsafe_allow_html=True)
+"""
+st.markdown(_CSS, unsafe_allow_html=True)
 
 def initialize_session_state():
     if 'messages' not in st.session_state:
@@ -126,8 +195,36 @@ def initialize_session_state():
         st.session_state.custom_model_name = "gpt-4o-mini" 
     if 'last_agent_raw_output' not in st.session_state:
         st.session_state.last_agent_raw_output = None
+    if 'comparison_results' not in st.session_state:
+        st.session_state.comparison_results = {}
+    if 'conversation_log' not in st.session_state:
+        st.session_state.conversation_log = None
+    if 'agent_settings' not in st.session_state:
+        st.session_state.agent_settings = None
+    if 'agent_turns' not in st.session_state:
+        st.session_state.agent_turns = []
+    if 'pending_batch' not in st.session_state:
+        st.session_state.pending_batch = None
 
-def create_agent(provider_name: str, model_name: str, role: str, role_description: str, agent_identifier: str = "Agent"): 
+@st.cache_resource(show_spinner=False, max_entries=32)
+def _system_message(role: str, role_description: str):
+    """Agent system message, shared by agents created with the same role and description."""
+    from camel.messages import BaseMessage
+    return BaseMessage.make_assistant_message(
+        role_name=role,
+        content=f"You are a {role}. {role_description}"
+    )
+
+def _user_message(content: str):
+    """User turn as a BaseMessage; this page always sends turns as "User"."""
+    from camel.messages import BaseMessage
+    return BaseMessage.make_user_message(role_name="User", content=content)
+
+def get_available_providers():
+    """Providers whose API key is set, in display order."""
+    return tuple(name for name, env_var in PROVIDER_API_KEY_ENV_VARS if os.getenv(env_var))
+
+def create_agent(provider_name: str, model_name: str, role: str, role_description: str, agent_identifier: str = "Agent", stream: bool = False): 
     model_instance = None
     model_name = model_name.strip()
 
@@ -143,112 +240,33 @@ def create_agent(provider_name: str, model_name: str, role: str, role_descriptio
         return None
 
     try:
-        provider_lower = provider_name.lower()
-        api_key = None
-        model_config_dict = {"max_tokens": 4096, "temperature": 0.7}
-        
-        if provider_lower == "openai":
-            api_key = os.getenv("OPENAI_API_KEY")
-            if not api_key:
-                st.error(f"OpenAI API Key not set for {agent_identifier}. Configure on Home page.")
-                return None
-            
-            # Use the latest model types and names
-            if model_name.lower() in ["gpt-4o", "gpt-4o-mini"]:
-                model_type = model_name.lower()
-            elif model_name.lower() in ["gpt-4.1", "gpt-4.1-mini"]:
-                model_type = model_name.lower()
-            elif model_name.lower() in ["o3", "o4-mini"]:
-                model_type = model_name.lower()
-            elif model_name.lower() == "gpt-4":
-                model_type = ModelType.GPT_4
-            elif model_name.lower() in ["gpt-3.5-turbo", "gpt-3.5"]:
-                model_type = ModelType.GPT_3_5_TURBO
-            else:
-                model_type = model_name  # Use as string for newer models
-            
-            model_instance = ModelFactory.create(
-                model_platform=ModelPlatformType.OPENAI,
-                model_type=model_type,
-                model_config_dict=ChatGPTConfig(**model_config_dict).as_dict(),
-                api_key=api_key
-            )
-            
-        elif provider_lower == "anthropic":
-            api_key = os.getenv("ANTHROPIC_API_KEY")
-            if not api_key:
-                st.error(f"Anthropic API Key not set for {agent_identifier}. Configure on Home page.")
-                return None
-            
-            # Use the latest Claude models with specific version names
-            if model_name.lower() in ["claude-opus-4-20250514", "claude-opus-4"]:
-                model_type = model_name
-            elif model_name.lower() in ["claude-sonnet-4-20250514", "claude-sonnet-4"]:
-                model_type = model_name
-            elif model_name.lower() in ["claude-3-7-sonnet-20250219", "claude-3-7-sonnet"]:
-                model_type = model_name
-            elif model_name.lower() in ["claude-3-5-haiku-20241022", "claude-3-5-haiku-latest"]:
-                model_type = model_name
-            elif model_name.lower() in ["claude-3-5-sonnet-latest", "claude-3-5-sonnet"]:
-                model_type = ModelType.CLAUDE_3_5_SONNET
-            elif model_name.lower() in ["claude-3-5-haiku-latest", "claude-3-5-haiku"]:
-                model_type = ModelType.CLAUDE_3_5_HAIKU
-            elif model_name.lower() == "claude-2":
-                model_type = ModelType.CLAUDE_2_1
-            else:
-                model_type = model_name  # Use as string for newer models
-            
-            model_instance = ModelFactory.create(
-                model_platform=ModelPlatformType.ANTHROPIC,
-                model_type=model_type,
-                model_config_dict=AnthropicConfig(**model_config_dict).as_dict(),
-                api_key=api_key
-            )
-            
-        elif provider_lower == "gemini":
-            api_key = os.getenv("GEMINI_API_KEY")
-            if not api_key:
-                st.error(f"Gemini API Key not set for {agent_identifier}. Configure on Home page.")
-                return None
-            
-            # Use the latest Gemini models with specific version names
-            if model_name.lower() in ["gemini-2.5-pro-preview-05-06", "gemini-2.5-pro"]:
-                model_type = model_name
-            elif model_name.lower() in ["gemini-2.5-flash-preview-05-20", "gemini-2.5-flash"]:
-                model_type = model_name
-            elif model_name.lower() in ["gemini-2.0-flash", "gemini-2-0-flash"]:
-                model_type = ModelType.GEMINI_2_0_FLASH
-            elif model_name.lower() in ["gemini-1.5-pro", "gemini-1-5-pro"]:
-                model_type = ModelType.GEMINI_1_5_PRO
-            elif model_name.lower() in ["gemini-1.5-flash", "gemini-1-5-flash"]:
-                model_type = ModelType.GEMINI_1_5_FLASH
-            else:
-                model_type = model_name  # Use as string for newer models
-            
-            model_instance = ModelFactory.create(
-                model_platform=ModelPlatformType.GEMINI,
-                model_type=model_type,
-                model_config_dict=GeminiConfig(**model_config_dict).as_dict(),
-                api_key=api_key
-            )
-            
-        elif provider_lower == "openrouter":
-            api_key = os.getenv("OPENROUTER_API_KEY")
-            if not api_key:
-                st.error(f"OpenRouter API Key not set for {agent_identifier}. Configure on Home page.")
-                return None
-            
-            model_instance = ModelFactory.create(
-                model_platform=ModelPlatformType.OPENROUTER,
-                model_type=model_name,
-                model_config_dict=model_config_dict,
-                api_key=api_key
-            )
-        else:
+        from camel.agents import ChatAgent
+
+        spec = _provider_registry().get(provider_name.lower())
+        if spec is None:
             st.error(f"Invalid provider selected: {provider_name} for {agent_identifier}.")
             logging.error(f"Invalid provider for {agent_identifier}: '{provider_name}'")
             return None
 
+        api_key = os.getenv(spec.env_var)
+        if not api_key:
+            st.error(f"{spec.name} API Key not set for {agent_identifier}. Configure on Home page.")
+            return None
+
+        model_config_dict = {"max_tokens": 4096, "temperature": 0.7}
+        if stream:
+            model_config_dict["stream"] = True
+        if spec.config_cls is not None:
+            model_config_dict = spec.config_cls(**model_config_dict).as_dict()
+
+        model_instance = create_model(
+            spec.platform,
+            spec.model_map.get(model_name.lower(), model_name),
+            model_config_dict,
+            spec.env_var,
+            key_fingerprint(api_key)
+        )
+
         if model_instance is None:
              st.error(f"Failed to create model instance for {agent_identifier} with provider '{provider_name}' and model '{model_name}'. Check model name & API key.")
              logging.error(f"ModelFactory.create returned None for {agent_identifier}. Provider='{provider_name}', Model='{model_name}'")
@@ -256,13 +274,7 @@ def create_agent(provider_name: str, model_name: str, role: str, role_descriptio
         
         logging.info(f"Model instance created successfully for {agent_identifier}. Now creating ChatAgent.")
         
-        # Create system message using the latest API
-        system_message = BaseMessage.make_assistant_message(
-            role_name=role,
-            content=f"You are a {role}. {role_description}"
-        )
-        
-        agent = ChatAgent(system_message=system_message, model=model_instance)
+        agent = ChatAgent(system_message=_system_message(role, role_description), model=model_instance, **(_agent_stream_kwargs() if stream else {}))
         logging.info(f"ChatAgent (type: {type(agent)}) created for {agent_identifier}.")
         return agent
         
@@ -271,17 +283,250 @@ def create_agent(provider_name: str, model_name: str, role: str, role_descriptio
         logging.error(f"Exception during {agent_identifier} creation: {str(e)}. Provider='{provider_name}', Model='{model_name}'", exc_info=True)
         return None
 
+@st.cache_resource(show_spinner=False)
+def _response_cache():
+    """Shared reply cache: insertion-ordered {key: (stored_at, reply)} and its lock."""
+    return threading.Lock(), {}
+
+def _response_cache_key(agent_settings, agent_turns, user_input: str) -> str:
+    """Digest of the agent's settings, every turn it has seen so far, and the new prompt."""
+    return hashlib.sha256(orjson.dumps([agent_settings, agent_turns, user_input])).hexdigest()
+
+def _cached_reply(cache_key: str):
+    lock, entries = _response_cache()
+    with lock:
+        entry = entries.get(cache_key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] > RESPONSE_CACHE_TTL:
+            del entries[cache_key]
+            return None
+        return entry[1]
+
+def _store_reply(cache_key: str, reply: str):
+    lock, entries = _response_cache()
+    with lock:
+        entries.pop(cache_key, None)
+        entries[cache_key] = (time.monotonic(), reply)
+        while len(entries) > RESPONSE_CACHE_MAX_ENTRIES:
+            del entries[next(iter(entries))]
+
+def _record_cached_turn(agent, user_msg, reply: str, role: str):
+    """Add a turn answered from the cache to the agent's memory, as if it had replied itself."""
+    from camel.messages import BaseMessage
+    from camel.types import OpenAIBackendRole
+    agent.update_memory(user_msg, OpenAIBackendRole.USER)
+    agent.record_message(BaseMessage.make_assistant_message(role_name=role, content=reply))
+
+def _stream_text(response):
+    """Yield the text each streamed chunk adds, for st.write_stream."""
+    shown = ""
+    for chunk in response:
+        if not chunk.msgs:
+            continue
+        content = chunk.msgs[0].content or ""
+        if len(content) > len(shown):
+            yield content[len(shown):]
+            shown = content
+
+async def _astep_all(agents, user_msg, max_concurrency: int, responses):
+    """Send user_msg to every agent concurrently, at most max_concurrency requests in flight.
+
+    Each agent's response, or the exception it raised, is stored in responses at its
+    index as it arrives, so the finished ones are kept if the rest get cancelled.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _astep(index, agent):
+        async with semaphore:
+            try:
+                responses[index] = await agent.astep(user_msg)
+            except Exception as e:
+                responses[index] = e
+
+    await asyncio.gather(*(_astep(index, agent) for index, agent in enumerate(agents)))
+
+def compare_providers(providers, prompt: str, role: str, role_description: str, max_concurrency: int):
+    """Ask the same prompt of one fresh agent per provider (using its default model) in parallel."""
+    agents = {}
+    for provider in providers:
+        agent = create_agent(provider, DEFAULT_MODEL_FOR_PROVIDER[provider], role, role_description, f"{provider} Comparison Agent")
+        if agent:
+            agents[provider] = agent
+    if not agents:
+        return {}
+
+    user_msg = _user_message(prompt)
+    responses = [None] * len(agents)
+    timeout = wait_timeout()
+    future = asyncio.run_coroutine_threadsafe(
+        _astep_all(list(agents.values()), user_msg, max_concurrency, responses),
+        event_loop()
+    )
+    try:
+        future.result(timeout=timeout)
+    except concurrent.futures.TimeoutError:
+        # A hung provider or stalled connection must not hold the script thread
+        future.cancel()
+        logging.error(f"Provider comparison timed out after {timeout:.0f}s")
+        responses = [
+            TimeoutError(f"no response within {timeout:.0f}s") if response is None else response
+            for response in responses
+        ]
+
+    results = {}
+    for provider, response in zip(agents, responses):
+        if isinstance(response, Exception):
+            logging.error(f"Comparison error for {provider}: {response}")
+            results[provider] = f"Error getting response: {response}"
+        elif response and response.msgs:
+            results[provider] = response.msgs[0].content
+        else:
+            results[provider] = "No valid response from agent."
+    return results
+
 def save_conversation(messages, role, provider, model_name_val):
-    save_dir = Path("conversation_history")
-    save_dir.mkdir(exist_ok=True)
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = save_dir / f"conversation_{timestamp}.json"
+    filename = CONVERSATION_DIR / f"conversation_{timestamp}.json"
     conversation_data = {
         "timestamp": timestamp, "role": role,
         "provider": provider, "model_name": model_name_val,
         "messages": messages
     }
-    with open(filename, 'w') as f: json.dump(conversation_data, f, indent=2)
+    filename.write_bytes(orjson.dumps(conversation_data, option=orjson.OPT_INDENT_2))
+
+def append_conversation(messages, role, provider, model_name_val, log=None):
+    """Append the messages not yet written to the chat's JSONL log, one line each.
+
+    With no log yet, starts a new .jsonl file whose first line is the conversation
+    header. Returns the log state to pass to the next call.
+    """
+    if log is None:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = CONVERSATION_DIR / f"conversation_{timestamp}.jsonl"
+        lines = [{"timestamp": timestamp, "role": role, "provider": provider, "model_name": model_name_val}]
+        written = 0
+    else:
+        filename = Path(log["path"])
+        lines = []
+        written = log["written"]
+    lines.extend(messages[written:])
+    with open(filename, 'ab') as f:
+        f.write(b"".join(orjson.dumps(line) + b"\n" for line in lines))
+    return {"path": str(filename), "written": len(messages)}
+
+def _batch_requests(paths):
+    """One (custom_id, system prompt, messages) entry per saved conversation.
+
+    Each conversation is replayed up to its last user message, so the batch
+    produces a fresh answer to the final prompt.
+    """
+    requests = []
+    for path in paths:
+        data = orjson.loads(path.read_bytes())
+        messages = [{"role": m["role"], "content": m["content"]} for m in data.get("messages", [])]
+        while messages and messages[-1]["role"] != "user":
+            messages.pop()
+        if not messages:
+            continue
+        requests.append((path.stem, f"You are a {data.get('role', 'AI Assistant')}.", messages))
+    return requests
+
+def submit_batch(provider: str, model_name: str, requests) -> str:
+    """Upload the requests to the provider's batch API and return the batch id."""
+    if provider == "OpenAI":
+        from openai import OpenAI
+        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=shared_http_client())
+        lines = [
+            orjson.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": model_name,
+                    # o-series models reject max_tokens; every chat model accepts this one
+                    "max_completion_tokens": 4096,
+                    "messages": [{"role": "system", "content": system}, *messages],
+                },
+            })
+            for custom_id, system, messages in requests
+        ]
+        batch_file = client.files.create(file=("batch_rerun.jsonl", b"\n".join(lines)), purpose="batch")
+        batch = client.batches.create(input_file_id=batch_file.id, endpoint="/v1/chat/completions", completion_window="24h")
+        return batch.id
+    if provider == "Anthropic":
+        from anthropic import Anthropic
+        client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"), http_client=shared_http_client())
+        batch = client.messages.batches.create(requests=[
+            {
+                "custom_id": custom_id,
+                "params": {"model": model_name, "max_tokens": 4096, "system": system, "messages": messages},
+            }
+            for custom_id, system, messages in requests
+        ])
+        return batch.id
+    raise ValueError(f"Batch re-run is not supported for provider: {provider}")
+
+class BatchFailedError(RuntimeError):
+    """The batch ended without results (failed, expired or cancelled); checking again won't help."""
+
+def fetch_batch_results(provider: str, batch_id: str):
+    """Return {custom_id: content} once the batch has finished, else None."""
+    if provider == "OpenAI":
+        from openai import OpenAI
+        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=shared_http_client())
+        batch = client.batches.retrieve(batch_id)
+        if batch.status in ("failed", "expired", "cancelled"):
+            raise BatchFailedError(f"Batch {batch_id} {batch.status}")
+        if batch.status != "completed":
+            return None
+        results = {}
+        if batch.output_file_id:
+            for line in client.files.content(batch.output_file_id).text.splitlines():
+                entry = orjson.loads(line)
+                body = (entry.get("response") or {}).get("body") or {}
+                choices = body.get("choices")
+                results[entry["custom_id"]] = choices[0]["message"]["content"] if choices else f"Error: {entry.get('error')}"
+        return results
+    if provider == "Anthropic":
+        from anthropic import Anthropic
+        client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"), http_client=shared_http_client())
+        if client.messages.batches.retrieve(batch_id).processing_status != "ended":
+            return None
+        results = {}
+        for entry in client.messages.batches.results(batch_id):
+            if entry.result.type == "succeeded":
+                results[entry.custom_id] = "".join(block.text for block in entry.result.message.content if block.type == "text")
+            else:
+                results[entry.custom_id] = f"Error: {entry.result.type}"
+        return results
+    raise ValueError(f"Batch re-run is not supported for provider: {provider}")
+
+def collect_batch(provider: str, batch_id: str):
+    """Check the batch once, without waiting.
+
+    Batches can take hours, so nothing polls in a loop on the script thread; the
+    Check Batch button calls this instead. Once the batch has finished, writes the
+    results next to the saved conversations and returns the output path, else None.
+    Raises BatchFailedError if the batch failed, expired or was cancelled.
+    """
+    results = fetch_batch_results(provider, batch_id)
+    if results is None:
+        return None
+    BATCH_RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    output_path = BATCH_RESULTS_DIR / f"{batch_id}.json"
+    output_path.write_bytes(orjson.dumps({"provider": provider, "batch_id": batch_id, "results": results}, option=orjson.OPT_INDENT_2))
+    logging.info(f"Batch {batch_id} finished: {len(results)} results written to {output_path}")
+    return output_path
+
+def batch_rerun(paths, provider: str, model_name: str):
+    """Submit saved conversations to the provider's batch API; returns the batch id, or None if nothing to re-run."""
+    requests = _batch_requests(paths)
+    if not requests:
+        return None
+    batch_id = submit_batch(provider, model_name.strip(), requests)
+    logging.info(f"Submitted {provider} batch {batch_id} with {len(requests)} conversations")
+    return batch_id
 
 def main():
     initialize_session_state()
@@ -306,14 +551,7 @@ def main():
         st.markdown("### 🛠️ Agent Configuration")
         
         # Provider selection with better styling
-        available_providers = []
-        if os.getenv("OPENAI_API_KEY"): available_providers.append("OpenAI")
-        if os.getenv("ANTHROPIC_API_KEY"): available_providers.append("Anthropic")
-        if os.getenv("GEMINI_API_KEY"): available_providers.append("Gemini")
-        if os.getenv("OPENROUTER_API_KEY"): available_providers.append("OpenRouter")
-        
-        if not available_providers:
-            available_providers = ["(Set API Keys on Home Page)"]
+        available_providers = get_available_providers() or ("(Set API Keys on Home Page)",)
         
         if st.session_state.selected_provider not in available_providers and available_providers[0] != "(Set API Keys on Home Page)":
             st.session_state.selected_provider = available_providers[0]
@@ -327,22 +565,15 @@ def main():
         st.session_state.selected_provider = selected_provider
 
         # Model name input with updated defaults
-        default_model_for_provider = {
-            "OpenAI": "gpt-4.1-mini", 
-            "Anthropic": "claude-sonnet-4-20250514",
-            "Gemini": "gemini-2.5-flash-preview-05-20", 
-            "OpenRouter": "google/gemini-flash-1.5"
-        }
-        
         if 'last_selected_provider_chat' not in st.session_state or st.session_state.last_selected_provider_chat != selected_provider:
-            st.session_state.custom_model_name = default_model_for_provider.get(selected_provider, "")
+            st.session_state.custom_model_name = DEFAULT_MODEL_FOR_PROVIDER.get(selected_provider, "")
         st.session_state.last_selected_provider_chat = selected_provider
 
         custom_model_name = st.text_input(
             f"🧠 Model Name for {selected_provider}",
             value=st.session_state.custom_model_name,
             key="model_name_chat_agent",
-            help=f"E.g., {default_model_for_provider.get(selected_provider, 'specific-model-name')}"
+            help=f"E.g., {DEFAULT_MODEL_FOR_PROVIDER.get(selected_provider, 'specific-model-name')}"
         )
         st.session_state.custom_model_name = custom_model_name
 
@@ -358,12 +589,34 @@ def main():
                         selected_provider, 
                         custom_model_name, 
                         role, role_description, 
-                        "Chat Agent"
+                        "Chat Agent",
+                        stream=True
                     )
+                    st.session_state.agent_settings = (selected_provider, custom_model_name.strip(), role, role_description)
+                    st.session_state.agent_turns = []
                     if st.session_state.agent:
                         st.success(f"✅ Agent created successfully!")
                         st.balloons()
 
+        # Same prompt to several providers at once
+        with st.expander("⚖️ Compare Providers"):
+            compare_targets = st.multiselect(
+                "Providers",
+                get_available_providers(),
+                key="compare_providers_select",
+                help="Each provider answers with its default model and the role above"
+            )
+            compare_prompt = st.text_area("Prompt", key="compare_prompt_input", height=80)
+            max_concurrency = st.slider("Max concurrent requests", 1, 8, 4, key="compare_max_concurrency")
+            if st.button("⚖️ Compare", key="compare_btn"):
+                if not compare_targets or not compare_prompt.strip():
+                    st.warning("Pick at least one provider and enter a prompt.")
+                else:
+                    with st.spinner("Asking providers..."):
+                        st.session_state.comparison_results = compare_providers(
+                            compare_targets, compare_prompt, role, role_description, max_concurrency
+                        )
+
         st.divider()
         
         # Conversation management
@@ -372,10 +625,21 @@ def main():
         with col1:
             if st.button("🗑️ Clear Chat", key="clear_chat_btn"):
                 st.session_state.messages = []
-                st.rerun()
+                st.session_state.conversation_log = None
         with col2:
             if st.button("💾 Save Chat", key="save_chat_btn"):
-                if st.session_state.messages:
+                if not st.session_state.messages:
+                    st.warning("No messages to save!")
+                elif st.session_state.get("save_chat_append"):
+                    st.session_state.conversation_log = append_conversation(
+                        st.session_state.messages,
+                        role,
+                        selected_provider,
+                        custom_model_name,
+                        st.session_state.conversation_log
+                    )
+                    st.success("New messages appended!")
+                else:
                     save_conversation(
                         st.session_state.messages, 
                         role, 
@@ -383,22 +647,54 @@ def main():
                         custom_model_name
                     )
                     st.success("Conversation saved!")
+        st.checkbox("Append to JSONL log", key="save_chat_append", help="Each save appends only the new messages to one .jsonl file per chat")
+
+        # Offline replay of every saved conversation through a provider batch endpoint
+        if st.button("📦 Batch Re-run Saved Chats", key="batch_rerun_btn", help="Uses the selected provider and model; OpenAI and Anthropic only"):
+            saved_paths = sorted(CONVERSATION_DIR.glob("*.json"))
+            if selected_provider not in BATCH_PROVIDERS:
+                st.warning(f"Batch re-run supports {', '.join(BATCH_PROVIDERS)} only.")
+            elif not saved_paths:
+                st.warning("No saved conversations to re-run!")
+            else:
+                try:
+                    with st.spinner(f"Submitting {len(saved_paths)} conversations..."):
+                        batch_id = batch_rerun(saved_paths, selected_provider, custom_model_name)
+                    if batch_id is None:
+                        st.warning("Saved conversations have no user messages to re-run.")
+                    else:
+                        st.session_state.pending_batch = {"provider": selected_provider, "id": batch_id}
+                        st.info(f"Batch {batch_id} submitted. Use Check Batch to collect the results.")
+                except Exception as e:
+                    st.error(f"Batch re-run failed: {str(e)}")
+                    logging.error(f"Batch re-run error: {str(e)}", exc_info=True)
+
+        pending_batch = st.session_state.pending_batch
+        if pending_batch and st.button(f"🔄 Check Batch {pending_batch['id']}", key="check_batch_btn"):
+            try:
+                with st.spinner("Checking batch..."):
+                    output_path = collect_batch(pending_batch["provider"], pending_batch["id"])
+                if output_path:
+                    st.session_state.pending_batch = None
+                    st.success(f"Batch finished: {output_path}")
                 else:
-                    st.warning("No messages to save!")
+                    st.info("Batch is still running.")
+            except BatchFailedError as e:
+                st.session_state.pending_batch = None
+                st.error(f"Batch failed: {str(e)}")
+                logging.error(f"Batch failed: {str(e)}")
+            except Exception as e:
+                # Likely transient (network error, 5xx, timeout): keep the batch so it can be checked again
+                st.error(f"Batch check failed, try again: {str(e)}")
+                logging.error(f"Batch check error: {str(e)}", exc_info=True)
 
     # Main chat interface
     if st.session_state.agent:
         # Chat history
         if st.session_state.messages:
             st.markdown("### 💬 Conversation")
-            with st.container():
-                st.markdown('<div class="chat-container">', unsafe_allow_html=True)
-                for message in st.session_state.messages:
-                    if message["role"] == "user":
-                        st.markdown(f'<div class="message user-message"><strong>You:</strong><br>{message["content"]}</div>', unsafe_allow_html=True)
-                    else:
-                        st.markdown(f'<div class="message agent-message"><strong>{role}:</strong><br>{message["content"]}</div>', unsafe_allow_html=True)
-                st.markdown('</div>', unsafe_allow_html=True)
+            for message in st.session_state.messages:
+                st.chat_message(message["role"]).markdown(message["content"])
 
         # Chat input
         user_input = st.chat_input("Type your message here...")
@@ -406,25 +702,36 @@ def main():
         if user_input:
             # Add user message
             st.session_state.messages.append({"role": "user", "content": user_input})
+            with st.chat_message("user"):
+                st.markdown(user_input)
             
-            # Get agent response
+            # Stream the agent response as it arrives; no rerun needed, the chat input already triggered one.
+            # A turn this agent has already answered with the same history is served from the cache.
             try:
-                with st.spinner(f"{role} is thinking..."):
-                    user_msg = BaseMessage.make_user_message(role_name="User", content=user_input)
+                user_msg = _user_message(user_input)
+                cache_key = _response_cache_key(st.session_state.agent_settings, st.session_state.agent_turns, user_input)
+                agent_response = _cached_reply(cache_key)
+                if agent_response is not None:
+                    with st.chat_message("assistant"):
+                        st.markdown(agent_response)
+                    _record_cached_turn(st.session_state.agent, user_msg, agent_response, st.session_state.agent_settings[2])
+                else:
                     response = st.session_state.agent.step(user_msg)
-                    
-                    if response and hasattr(response, 'msg') and response.msg:
-                        agent_response = response.msg.content
-                        st.session_state.messages.append({"role": "assistant", "content": agent_response})
+                    with st.chat_message("assistant"):
+                        agent_response = st.write_stream(_stream_text(response))
+                    if agent_response:
+                        _store_reply(cache_key, agent_response)
                         st.session_state.last_agent_raw_output = response
-                    else:
-                        st.error("No valid response from agent.")
+                
+                if agent_response:
+                    st.session_state.messages.append({"role": "assistant", "content": agent_response})
+                    st.session_state.agent_turns.append((user_input, agent_response))
+                else:
+                    st.error("No valid response from agent.")
                         
             except Exception as e:
                 st.error(f"Error getting response: {str(e)}")
                 logging.error(f"Chat error: {str(e)}", exc_info=True)
-            
-            st.rerun()
     else:
         # No agent configured
         st.markdown("### 🎯 Getting Started")
@@ -444,15 +751,23 @@ def main():
 
     # Display conversation stats
     if st.session_state.messages:
+        role_counts = Counter(m["role"] for m in st.session_state.messages)
         col1, col2, col3 = st.columns(3)
         with col1:
             st.metric("💬 Messages", len(st.session_state.messages))
         with col2:
-            user_msgs = len([m for m in st.session_state.messages if m["role"] == "user"])
-            st.metric("👤 Your Messages", user_msgs)
+            st.metric("👤 Your Messages", role_counts["user"])
         with col3:
-            agent_msgs = len([m for m in st.session_state.messages if m["role"] == "assistant"])
-            st.metric("🤖 Agent Messages", agent_msgs)
+            st.metric("🤖 Agent Messages", role_counts["assistant"])
+
+    # Provider comparison results
+    if st.session_state.comparison_results:
+        st.markdown("### ⚖️ Provider Comparison")
+        result_cols = st.columns(len(st.session_state.comparison_results))
+        for col, (provider, content) in zip(result_cols, st.session_state.comparison_results.items()):
+            with col:
+                st.markdown(f"**{provider}** · `{DEFAULT_MODEL_FOR_PROVIDER[provider]}`")
+                st.markdown(content)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,14 +1,19 @@
 import streamlit as st
+import asyncio
+import contextlib
+import html
+import inspect
 import os
-from camel.societies import RolePlaying
-from camel.messages import BaseMessage
-from camel.types import ModelType, TaskType, ModelPlatformType
-from camel.models import ModelFactory
-from camel.configs import ChatGPTConfig, AnthropicConfig, GeminiConfig
+import queue
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import json
+import orjson
 from pathlib import Path
 import logging
+from types import MappingProxyType
+from utils.model_clients import create_model, event_loop, key_fingerprint
 
 # Configure basic logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -20,17 +25,114 @@ st.set_page_config(
     layout="wide"
 )
 
+@st.cache_resource(show_spinner=False)
+def _providers():
+    """Lower-cased provider name -> (API key env var, config class or None, platform, model aliases).
+
+    The aliases map lower-cased model names to a CAMEL ModelType or a normalized name;
+    anything not listed is passed through as typed. Built on first model creation so
+    the page renders without importing CAMEL.
+    """
+    from camel.configs import ChatGPTConfig, AnthropicConfig, GeminiConfig
+    from camel.types import ModelType, ModelPlatformType
+
+    def model_type(member: str, fallback: str):
+        # Members missing from this CAMEL version fall back to the plain model name
+        return getattr(ModelType, member, fallback)
+
+    openai_aliases = MappingProxyType({
+        "gpt-4o": "gpt-4o",
+        "gpt-4o-mini": "gpt-4o-mini",
+        "gpt-4.1": "gpt-4.1",
+        "gpt-4.1-mini": "gpt-4.1-mini",
+        "o3": "o3",
+        "o4-mini": "o4-mini",
+        "gpt-4": model_type("GPT_4", "gpt-4"),
+        "gpt-3.5-turbo": model_type("GPT_3_5_TURBO", "gpt-3.5-turbo"),
+        "gpt-3.5": model_type("GPT_3_5_TURBO", "gpt-3.5-turbo"),
+    })
+    anthropic_aliases = MappingProxyType({
+        "claude-3-5-sonnet-latest": model_type("CLAUDE_3_5_SONNET", "claude-3-5-sonnet-latest"),
+        "claude-3-5-sonnet": model_type("CLAUDE_3_5_SONNET", "claude-3-5-sonnet-latest"),
+        "claude-3-5-haiku": model_type("CLAUDE_3_5_HAIKU", "claude-3-5-haiku-latest"),
+        "claude-2": model_type("CLAUDE_2_1", "claude-2.1"),
+    })
+    gemini_aliases = MappingProxyType({
+        "gemini-2.0-flash": model_type("GEMINI_2_0_FLASH", "gemini-2.0-flash"),
+        "gemini-2-0-flash": model_type("GEMINI_2_0_FLASH", "gemini-2.0-flash"),
+        "gemini-1.5-pro": model_type("GEMINI_1_5_PRO", "gemini-1.5-pro"),
+        "gemini-1-5-pro": model_type("GEMINI_1_5_PRO", "gemini-1.5-pro"),
+        "gemini-1.5-flash": model_type("GEMINI_1_5_FLASH", "gemini-1.5-flash"),
+        "gemini-1-5-flash": model_type("GEMINI_1_5_FLASH", "gemini-1.5-flash"),
+    })
+    return MappingProxyType({
+        "openai": ("OPENAI_API_KEY", ChatGPTConfig, ModelPlatformType.OPENAI, openai_aliases),
+        "anthropic": ("ANTHROPIC_API_KEY", AnthropicConfig, ModelPlatformType.ANTHROPIC, anthropic_aliases),
+        "gemini": ("GEMINI_API_KEY", GeminiConfig, ModelPlatformType.GEMINI, gemini_aliases),
+        "openrouter": ("OPENROUTER_API_KEY", None, ModelPlatformType.OPENROUTER, MappingProxyType({})),
+    })
+
+# Providers the page can use, with the env var holding each API key
+PROVIDER_API_KEY_ENV_VARS = (
+    ("OpenAI", "OPENAI_API_KEY"),
+    ("Anthropic", "ANTHROPIC_API_KEY"),
+    ("Gemini", "GEMINI_API_KEY"),
+    ("OpenRouter", "OPENROUTER_API_KEY"),
+)
+
+# Model name input defaults
+DEFAULT_MODEL_FOR_PROVIDER = MappingProxyType({
+    "OpenAI": "gpt-4.1-mini", 
+    "Anthropic": "claude-sonnet-4-20250514",
+    "Gemini": "gemini-2.5-flash-preview-05-20", 
+    "OpenRouter": "google/gemini-flash-1.5"
+})
+
+# Each agent's history is trimmed to about this many tokens before a turn
+ROLE_PLAY_TOKEN_BUDGET = 6000
+
+# The user agent's turn is tried this many times on transient errors, with
+# exponential backoff and jitter from this base delay, after the SDK's own retries
+STEP_MAX_ATTEMPTS = 3
+STEP_RETRY_BASE_DELAY = 2.0
+
+# Lower-cased provider name -> (max model calls in flight, requests per minute)
+PROVIDER_CALL_LIMITS = MappingProxyType({
+    "openai": (4, 200),
+    "anthropic": (4, 50),
+    "gemini": (4, 60),
+    "openrouter": (4, 60),
+})
+
+# Chat message markup; name and content are escaped before formatting
+_USER_MESSAGE_HTML = '<div class="message user-message"><b>{name}</b>: {content}</div>'.format
+_ASSISTANT_MESSAGE_HTML = '<div class="message assistant-message"><b>{name}</b>: {content}</div>'.format
+
+# Number of most recent messages drawn in the main chat view
+VISIBLE_MESSAGE_WINDOW = 50
+
+# Saved sessions: a .jsonl message log per conversation, plus its .json header
+ROLE_PLAY_DIR = Path("role_play_history")
+ROLE_PLAY_DIR.mkdir(exist_ok=True)
+
+# Streamed replies are redrawn at most this often, or sooner at a sentence end
+STREAM_FLUSH_SECONDS = 0.05
+SENTENCE_ENDS = (".", "?", "!", "\n")
+
+@st.cache_resource(show_spinner=False)
+def _assistant_stream_kwargs():
+    """ChatAgent kwargs so streamed chunks carry the text so far.
+
+    Newer CAMEL releases default to deltas and need stream_accumulate=True.
+    """
+    from camel.agents import ChatAgent
+    if "stream_accumulate" in inspect.signature(ChatAgent.__init__).parameters:
+        return {"stream_accumulate": True}
+    return {}
+
 # Custom CSS
-st.markdown("""
+_CSS = """
     <style>
-    .chat-container {
-        background-color: #f0f2f6;
-        padding: 1rem;
-        border-radius: 0.5rem;
-        margin: 1rem 0;
-        max-height: 500px;
-        overflow-y: auto;
-    }
     .message {
         padding: 0.5rem;
         margin: 0.5rem;
@@ -45,22 +147,49 @@ st.markdown("""
         margin-right: 2rem;
     }
     </style>
-""", unsafe_allow_html=True)
+"""
+st.markdown(_CSS, unsafe_allow_html=True)
 
 def initialize_session_state_role_playing():
     if 'role_playing_session' not in st.session_state:
         st.session_state.role_playing_session = None
     if 'role_playing_messages' not in st.session_state:
         st.session_state.role_playing_messages = []
+    if 'role_playing_rendered_html' not in st.session_state:
+        st.session_state.role_playing_rendered_html = []
     if 'role_playing_conversation_history' not in st.session_state:
         st.session_state.role_playing_conversation_history = []
+    if 'rp_log' not in st.session_state:
+        st.session_state.rp_log = None
+    if 'rp_role_names' not in st.session_state:
+        st.session_state.rp_role_names = {"user": "User", "assistant": "Assistant"}
+    if 'rp_session_provider' not in st.session_state:
+        st.session_state.rp_session_provider = None
+    if 'rp_pending_session' not in st.session_state:
+        st.session_state.rp_pending_session = None
+    if 'rp_record_tokens' not in st.session_state:
+        st.session_state.rp_record_tokens = {}
     # For provider dropdown and model name text input
     if 'rp_selected_provider' not in st.session_state:
         st.session_state.rp_selected_provider = "OpenAI"
     if 'rp_custom_model_name' not in st.session_state:
         st.session_state.rp_custom_model_name = "gpt-4o-mini"
 
-def create_model_instance(provider_name: str, model_name: str, agent_identifier: str = "Agent"):
+@st.cache_resource(show_spinner=False, max_entries=32)
+def _config_dict(provider_lower: str, max_tokens: int, temperature: float, stream: bool) -> dict:
+    """Model config dict for a provider, validated through its CAMEL config class once per settings.
+
+    Callers get the shared dict back and must copy it before handing it on.
+    """
+    config_dict = {"max_tokens": max_tokens, "temperature": temperature}
+    if stream:
+        config_dict["stream"] = True
+    config_cls = _providers()[provider_lower][1]
+    if config_cls is not None:
+        config_dict = config_cls(**config_dict).as_dict()
+    return config_dict
+
+def create_model_instance(provider_name: str, model_name: str, agent_identifier: str = "Agent", stream: bool = False):
     """Create a model instance for role playing."""
     model_name = model_name.strip()
 
@@ -74,110 +203,24 @@ def create_model_instance(provider_name: str, model_name: str, agent_identifier:
         return None
 
     try:
-        provider_lower = provider_name.lower()
-        api_key = None
-        model_config_dict = {"max_tokens": 4096, "temperature": 0.7}
-        
-        if provider_lower == "openai":
-            api_key = os.getenv("OPENAI_API_KEY")
-            if not api_key:
-                st.error(f"OpenAI API Key not set for {agent_identifier}. Configure on Home page.")
-                return None
-            
-            # Use the latest model types and names
-            if model_name.lower() in ["gpt-4o", "gpt-4o-mini"]:
-                model_type = model_name.lower()
-            elif model_name.lower() in ["gpt-4.1", "gpt-4.1-mini"]:
-                model_type = model_name.lower()
-            elif model_name.lower() in ["o3", "o4-mini"]:
-                model_type = model_name.lower()
-            elif model_name.lower() == "gpt-4":
-                model_type = ModelType.GPT_4
-            elif model_name.lower() in ["gpt-3.5-turbo", "gpt-3.5"]:
-                model_type = ModelType.GPT_3_5_TURBO
-            else:
-                model_type = model_name  # Use as string for newer models
-            
-            model_instance = ModelFactory.create(
-                model_platform=ModelPlatformType.OPENAI,
-                model_type=model_type,
-                model_config_dict=ChatGPTConfig(**model_config_dict).as_dict(),
-                api_key=api_key
-            )
-            
-        elif provider_lower == "anthropic":
-            api_key = os.getenv("ANTHROPIC_API_KEY")
-            if not api_key:
-                st.error(f"Anthropic API Key not set for {agent_identifier}. Configure on Home page.")
-                return None
-            
-            # Use the latest Claude models with specific version names
-            if model_name.lower() in ["claude-opus-4-20250514", "claude-opus-4"]:
-                model_type = model_name
-            elif model_name.lower() in ["claude-sonnet-4-20250514", "claude-sonnet-4"]:
-                model_type = model_name
-            elif model_name.lower() in ["claude-3-7-sonnet-20250219", "claude-3-7-sonnet"]:
-                model_type = model_name
-            elif model_name.lower() in ["claude-3-5-haiku-20241022", "claude-3-5-haiku-latest"]:
-                model_type = model_name
-            elif model_name.lower() in ["claude-3-5-sonnet-latest", "claude-3-5-sonnet"]:
-                model_type = ModelType.CLAUDE_3_5_SONNET
-            elif model_name.lower() in ["claude-3-5-haiku-latest", "claude-3-5-haiku"]:
-                model_type = ModelType.CLAUDE_3_5_HAIKU
-            elif model_name.lower() == "claude-2":
-                model_type = ModelType.CLAUDE_2_1
-            else:
-                model_type = model_name  # Use as string for newer models
-            
-            model_instance = ModelFactory.create(
-                model_platform=ModelPlatformType.ANTHROPIC,
-                model_type=model_type,
-                model_config_dict=AnthropicConfig(**model_config_dict).as_dict(),
-                api_key=api_key
-            )
-            
-        elif provider_lower == "gemini":
-            api_key = os.getenv("GEMINI_API_KEY")
-            if not api_key:
-                st.error(f"Gemini API Key not set for {agent_identifier}. Configure on Home page.")
-                return None
-            
-            # Use the latest Gemini models with specific version names
-            if model_name.lower() in ["gemini-2.5-pro-preview-05-06", "gemini-2.5-pro"]:
-                model_type = model_name
-            elif model_name.lower() in ["gemini-2.5-flash-preview-05-20", "gemini-2.5-flash"]:
-                model_type = model_name
-            elif model_name.lower() in ["gemini-2.0-flash", "gemini-2-0-flash"]:
-                model_type = ModelType.GEMINI_2_0_FLASH
-            elif model_name.lower() in ["gemini-1.5-pro", "gemini-1-5-pro"]:
-                model_type = ModelType.GEMINI_1_5_PRO
-            elif model_name.lower() in ["gemini-1.5-flash", "gemini-1-5-flash"]:
-                model_type = ModelType.GEMINI_1_5_FLASH
-            else:
-                model_type = model_name  # Use as string for newer models
-            
-            model_instance = ModelFactory.create(
-                model_platform=ModelPlatformType.GEMINI,
-                model_type=model_type,
-                model_config_dict=GeminiConfig(**model_config_dict).as_dict(),
-                api_key=api_key
-            )
-            
-        elif provider_lower == "openrouter":
-            api_key = os.getenv("OPENROUTER_API_KEY")
-            if not api_key:
-                st.error(f"OpenRouter API Key not set for {agent_identifier}. Configure on Home page.")
-                return None
-            
-            model_instance = ModelFactory.create(
-                model_platform=ModelPlatformType.OPENROUTER,
-                model_type=model_name,
-                model_config_dict=model_config_dict,
-                api_key=api_key
-            )
-        else:
+        provider = _providers().get(provider_name.lower())
+        if provider is None:
             st.error(f"Invalid provider selected: {provider_name} for {agent_identifier}.")
             return None
+        env_var, _, platform, aliases = provider
+
+        api_key = os.getenv(env_var)
+        if not api_key:
+            st.error(f"{provider_name} API Key not set for {agent_identifier}. Configure on Home page.")
+            return None
+
+        model_instance = create_model(
+            platform,
+            aliases.get(model_name.lower(), model_name),
+            dict(_config_dict(provider_name.lower(), 4096, 0.7, stream)),
+            env_var,
+            key_fingerprint(api_key)
+        )
 
         if model_instance is None:
              st.error(f"Failed to create model instance for {agent_identifier} with provider '{provider_name}' and model '{model_name}'. Check model name & API key.")
@@ -191,22 +234,271 @@ def create_model_instance(provider_name: str, model_name: str, agent_identifier:
         logging.error(f"Exception during model creation for {agent_identifier} in Role Playing: {str(e)}", exc_info=True)
         return None
 
-def save_conversation_role_playing(messages, ai_role, user_role, task_prompt, provider, model_name_val):
-    save_dir = Path("role_play_history")
-    save_dir.mkdir(exist_ok=True)
+def _message_html(role: str, name: str, content: str) -> str:
+    template = _USER_MESSAGE_HTML if role == "user" else _ASSISTANT_MESSAGE_HTML
+    return template(name=html.escape(name), content=html.escape(content))
+
+def append_message(role: str, content: str):
+    """Add a chat message along with its pre-rendered HTML."""
+    st.session_state.role_playing_messages.append({"role": role, "content": content})
+    st.session_state.role_playing_rendered_html.append(
+        _message_html(role, st.session_state.rp_role_names[role], content)
+    )
+
+def clear_messages():
+    st.session_state.role_playing_messages = []
+    st.session_state.role_playing_rendered_html = []
+
+def draw_chat(older_slot, recent_slot):
+    """Draw the last VISIBLE_MESSAGE_WINDOW messages into recent_slot, anything older into an expander in older_slot."""
+    rendered_html = st.session_state.role_playing_rendered_html
+    older_count = len(rendered_html) - VISIBLE_MESSAGE_WINDOW
+    if older_count > 0:
+        with older_slot.container():
+            with st.expander(f"Show earlier {older_count} messages"):
+                st.markdown("".join(rendered_html[:older_count]), unsafe_allow_html=True)
+    if rendered_html:
+        recent_slot.markdown("".join(rendered_html[-VISIBLE_MESSAGE_WINDOW:]), unsafe_allow_html=True)
+
+class CallGate:
+    """Async context manager around a model call.
+
+    At most max_concurrent calls are in flight, and call starts are spaced so they
+    stay under requests_per_minute instead of waiting for the provider's 429s.
+    """
+
+    def __init__(self, max_concurrent: int, requests_per_minute: int):
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._interval = 60 / requests_per_minute
+        self._next_start = 0.0
+
+    async def __aenter__(self):
+        await self._semaphore.acquire()
+        now = time.monotonic()
+        start = max(now, self._next_start)
+        self._next_start = start + self._interval
+        try:
+            await asyncio.sleep(start - now)
+        except BaseException:
+            self._semaphore.release()
+            raise
+
+    async def __aexit__(self, *exc_info):
+        self._semaphore.release()
+
+@st.cache_resource(show_spinner=False)
+def _call_gate(provider_lower: str):
+    """The CallGate for a provider, shared by every session since limits are per API key."""
+    return CallGate(*PROVIDER_CALL_LIMITS[provider_lower])
+
+@st.cache_resource(show_spinner=False)
+def _token_encoding():
+    """tiktoken encoding for budgeting history, or None if tiktoken or its encoding files are unavailable."""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logging.warning(f"tiktoken unavailable, estimating tokens from length: {str(e)}")
+        return None
+
+def count_tokens(text: str) -> int:
+    encoding = _token_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+def trim_agent_memory(agent, budget: int = ROLE_PLAY_TOKEN_BUDGET):
+    """Drop an agent's oldest turns until its history fits in budget tokens.
+
+    The system message and the newest record are always kept. Token counts are
+    remembered per record in rp_record_tokens, so each message is encoded once.
+    """
+    memory = agent.memory
+    # Older CAMEL releases can't remove individual records
+    if not hasattr(memory, "remove_records_by_indices"):
+        return
+    record_tokens = st.session_state.rp_record_tokens
+    records = [context_record.memory_record for context_record in memory.retrieve()]
+    counts = []
+    for record in records:
+        if record.uuid not in record_tokens:
+            record_tokens[record.uuid] = count_tokens(record.message.content or "")
+        counts.append(record_tokens[record.uuid])
+
+    total = sum(counts)
+    index = 1 if records and records[0].role_at_backend.value in ("system", "developer") else 0
+    drop = []
+    while total > budget and index < len(records) - 1:
+        drop.append(index)
+        total -= counts[index]
+        index += 1
+    if drop:
+        for removed in memory.remove_records_by_indices(drop):
+            record_tokens.pop(removed.uuid, None)
+        logging.info(f"Trimmed {len(drop)} old records from {agent.role_name} memory to stay near {budget} tokens")
+
+def _is_transient(error: Exception) -> bool:
+    """Timeouts, connection errors, 408/409/429 and 5xx; auth and other 4xx errors are not."""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    if type(error).__name__ in ("APIConnectionError", "APITimeoutError"):
+        return True
+    status_code = getattr(error, "status_code", None)
+    return isinstance(status_code, int) and (status_code in (408, 409, 429) or status_code >= 500)
+
+async def _astep_with_retry(agent, msg, gate):
+    """agent.astep under gate, retried on transient errors with exponential backoff and jitter.
+
+    astep records msg in memory before calling the model, so the records a failed
+    attempt added are removed before the next one. Older CAMEL releases can't remove
+    records, so there the call is not retried.
+    """
+    memory = agent.memory
+    can_roll_back = hasattr(memory, "remove_records_by_indices")
+    for attempt in range(1, STEP_MAX_ATTEMPTS + 1):
+        record_count = len(memory.retrieve()) if can_roll_back else 0
+        try:
+            async with gate:
+                return await agent.astep(msg)
+        except Exception as e:
+            if not can_roll_back or attempt == STEP_MAX_ATTEMPTS or not _is_transient(e):
+                raise
+            added = list(range(record_count, len(memory.retrieve())))
+            if added:
+                memory.remove_records_by_indices(added)
+            delay = STEP_RETRY_BASE_DELAY * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+            logging.warning(f"{agent.role_name} step failed ({str(e)}), retrying in {delay:.1f}s (attempt {attempt} of {STEP_MAX_ATTEMPTS})")
+            await asyncio.sleep(delay)
+
+async def run_step(session, msg, on_text=None, gate=None):
+    """One round: the user agent answers msg, then the assistant answers the user agent.
+
+    With on_text, the assistant's reply is streamed and on_text gets the text so far
+    after every chunk. Each model call waits on gate when one is given, and the
+    user agent's turn is retried on transient errors.
+    Returns the (assistant, user) responses like RolePlaying.astep.
+    """
+    from camel.responses import ChatAgentResponse
+
+    gate = gate or contextlib.nullcontext()
+    if on_text is None:
+        async with gate:
+            return await session.astep(msg)
+
+    # RolePlaying.astep would consume the stream itself, so drive the two agents here
+    user_response = await _astep_with_retry(session.user_agent, msg, gate)
+    if user_response.terminated or not user_response.msgs:
+        return ChatAgentResponse(msgs=[], terminated=False, info={}), user_response
+
+    assistant_response = None
+    async with gate:
+        async for chunk in await session.assistant_agent.astep(user_response.msgs[0]):
+            assistant_response = chunk
+            if chunk.msgs:
+                on_text(chunk.msgs[0].content)
+    return assistant_response or ChatAgentResponse(msgs=[], terminated=False, info={}), user_response
+
+def stream_step_session(session, msg, placeholder, speaker: str, provider_lower: str):
+    """Run run_step on the shared loop, showing the assistant's reply in placeholder as it streams.
+
+    Model calls go through the provider's CallGate. Chunks are batched: the placeholder
+    is redrawn at most every STREAM_FLUSH_SECONDS, or right away when the text
+    reaches a sentence end.
+    """
+    updates = queue.Queue()
+    future = asyncio.run_coroutine_threadsafe(
+        run_step(session, msg, on_text=updates.put, gate=_call_gate(provider_lower)),
+        event_loop()
+    )
+
+    def draw(text):
+        placeholder.markdown(_message_html("assistant", speaker, text), unsafe_allow_html=True)
+
+    text = shown = ""
+    last_flush = time.monotonic()
+    while True:
+        try:
+            text = updates.get(timeout=STREAM_FLUSH_SECONDS)
+        except queue.Empty:
+            if future.done():
+                break
+            continue
+        now = time.monotonic()
+        if now - last_flush >= STREAM_FLUSH_SECONDS or text.endswith(SENTENCE_ENDS):
+            draw(text)
+            shown, last_flush = text, now
+    if text and text != shown:
+        draw(text)
+    return future.result()
+
+@st.cache_resource(show_spinner=False)
+def _setup_executor():
+    """Worker threads that build RolePlaying sessions off the script thread."""
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="role-playing-setup")
+
+@st.fragment(run_every=0.5)
+def wait_for_pending_session():
+    """Poll the session being built and rerun the page once it is ready."""
+    if st.session_state.rp_pending_session["future"].done():
+        st.rerun()
+    st.info("⏳ Specifying task...")
+
+def finish_pending_session():
+    """Install the finished background session, or report why it failed to build."""
+    pending = st.session_state.rp_pending_session
+    st.session_state.rp_pending_session = None
+    try:
+        st.session_state.role_playing_session = pending["future"].result()
+    except Exception as e:
+        st.error(f"Error initializing RolePlaying session: {str(e)}")
+        logging.error(f"Exception while building RolePlaying session: {str(e)}", exc_info=True)
+        st.session_state.role_playing_session = None
+        return
+    st.session_state.rp_role_names = pending["role_names"]
+    st.session_state.rp_session_provider = pending["provider"].lower()
+    st.session_state.rp_record_tokens = {}
+    clear_messages()
+    start_conversation_log()
+    st.success(f"Role playing session started with {pending['provider']}: {pending['model_name']}!")
+
+def get_available_providers():
+    """Providers whose API key is set, in display order."""
+    return tuple(name for name, env_var in PROVIDER_API_KEY_ENV_VARS if os.getenv(env_var))
+
+def start_conversation_log():
+    """Begin a new conversation: empty history and a fresh .jsonl log, none of it written yet."""
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = save_dir / f"role_playing_{timestamp}.json"
+    st.session_state.role_playing_conversation_history = []
+    st.session_state.rp_log = {"path": str(ROLE_PLAY_DIR / f"role_playing_{timestamp}.jsonl"), "written": 0}
+
+def append_history(role_name: str, content: str):
+    """Record one turn in the history; turns reach the log on save."""
+    st.session_state.role_playing_conversation_history.append({"role": role_name, "content": content})
+
+def save_conversation_role_playing(messages, ai_role, user_role, task_prompt, provider, model_name_val, log):
+    """Append the turns not yet written to the conversation's .jsonl log and write its .json header.
+
+    Each save writes only the new turns; the header names the log in "messages_log".
+    Returns the log state to pass to the next call.
+    """
+    log_path = Path(log["path"])
+    with open(log_path, 'ab') as f:
+        f.write(b"".join(orjson.dumps(message) + b"\n" for message in messages[log["written"]:]))
+        f.flush()
+        os.fsync(f.fileno())
     conversation_data = {
-        "timestamp": timestamp,
+        "timestamp": datetime.now().strftime("%Y%m%d_%H%M%S"),
         "ai_role": ai_role, "user_role": user_role, "task_prompt": task_prompt,
         "provider": provider, "model_name": model_name_val,
-        "messages": messages
+        "messages_log": log_path.name
     }
-    with open(filename, 'w') as f: json.dump(conversation_data, f, indent=2)
+    log_path.with_suffix(".json").write_bytes(orjson.dumps(conversation_data, option=orjson.OPT_INDENT_2))
+    return {"path": str(log_path), "written": len(messages)}
 
 
 def main():
     initialize_session_state_role_playing()
+    available_providers = get_available_providers()
     
     # Enhanced header with back button
     col1, col2 = st.columns([1, 6])
@@ -222,14 +514,7 @@ def main():
         st.header("Scenario Configuration")
 
         # Provider selection with better styling
-        available_providers = []
-        if os.getenv("OPENAI_API_KEY"): available_providers.append("OpenAI")
-        if os.getenv("ANTHROPIC_API_KEY"): available_providers.append("Anthropic")
-        if os.getenv("GEMINI_API_KEY"): available_providers.append("Gemini")
-        if os.getenv("OPENROUTER_API_KEY"): available_providers.append("OpenRouter")
-        
-        if not available_providers:
-            available_providers = ["(Set API Keys on Home Page)"]
+        available_providers = available_providers or ("(Set API Keys on Home Page)",)
 
         if st.session_state.rp_selected_provider not in available_providers and available_providers[0] != "(Set API Keys on Home Page)":
             st.session_state.rp_selected_provider = available_providers[0]
@@ -243,22 +528,15 @@ def main():
         st.session_state.rp_selected_provider = selected_provider
 
         # Model name input with updated defaults
-        default_model_for_provider = {
-            "OpenAI": "gpt-4.1-mini", 
-            "Anthropic": "claude-sonnet-4-20250514",
-            "Gemini": "gemini-2.5-flash-preview-05-20", 
-            "OpenRouter": "google/gemini-flash-1.5"
-        }
-        
         if 'rp_last_selected_provider' not in st.session_state or st.session_state.rp_last_selected_provider != selected_provider:
-            st.session_state.rp_custom_model_name = default_model_for_provider.get(selected_provider, "")
+            st.session_state.rp_custom_model_name = DEFAULT_MODEL_FOR_PROVIDER.get(selected_provider, "")
         st.session_state.rp_last_selected_provider = selected_provider
         
         custom_model_name = st.text_input(
             f"Enter Model Name for {selected_provider}",
             value=st.session_state.rp_custom_model_name,
             key="rp_model_name_input",
-            help=f"E.g., {default_model_for_provider.get(selected_provider, 'specific-model-name')}"
+            help=f"E.g., {DEFAULT_MODEL_FOR_PROVIDER.get(selected_provider, 'specific-model-name')}"
         )
         st.session_state.rp_custom_model_name = custom_model_name
 
@@ -285,83 +563,106 @@ def main():
                     custom_model_name, 
                     "Shared Model" 
                 )
+                # The assistant gets its own streaming model so replies can render as they arrive
+                assistant_model = common_model and create_model_instance(
+                    selected_provider,
+                    custom_model_name,
+                    "Assistant Model",
+                    stream=True
+                )
 
-                if common_model:
-                    try:
-                        st.session_state.role_playing_session = RolePlaying(
+                if common_model and assistant_model:
+                    from camel.societies import RolePlaying
+                    from camel.types import TaskType
+                    # RolePlaying makes the task specification call while it is built, so build it in the background
+                    st.session_state.rp_pending_session = {
+                        "future": _setup_executor().submit(
+                            RolePlaying,
                             assistant_role_name=ai_role_name,
-                            assistant_agent_kwargs=dict(model=common_model),
+                            assistant_agent_kwargs=dict(model=assistant_model, **_assistant_stream_kwargs()),
                             user_role_name=user_role_name,
                             user_agent_kwargs=dict(model=common_model),
                             task_prompt=task_prompt,
                             with_task_specify=True,
                             task_specify_agent_kwargs=dict(model=common_model),
-                            task_type=TaskType.CODE, # or other types
-                            word_limit=word_limit 
-                        )
-                        st.session_state.role_playing_messages = []
-                        st.session_state.role_playing_conversation_history = []
-                        st.success(f"Role playing session started with {selected_provider}: {custom_model_name}!")
-                    except Exception as e:
-                        st.error(f"Error initializing RolePlaying session: {str(e)}")
-                        st.session_state.role_playing_session = None
+                            task_type=TaskType.AI_SOCIETY, # or other types
+                            extend_task_specify_meta_dict=dict(word_limit=word_limit)
+                        ),
+                        "role_names": {"user": user_role_name, "assistant": ai_role_name},
+                        "provider": selected_provider,
+                        "model_name": custom_model_name,
+                    }
                 else:
                     st.error("Failed to create model for Role Playing. Check provider, model name, and API keys.")
         
         st.divider()
         if st.button("Save Conversation", key="rp_save_convo_btn"):
             if st.session_state.role_playing_conversation_history:
-                save_conversation_role_playing(
+                st.session_state.rp_log = save_conversation_role_playing(
                     st.session_state.role_playing_conversation_history,
                     ai_role_name, user_role_name, task_prompt,
-                    selected_provider, custom_model_name
+                    selected_provider, custom_model_name,
+                    st.session_state.rp_log
                 )
                 st.success("Role Playing Conversation saved!")
             else:
                 st.warning("No conversation to save.")
 
         if st.button("Clear Conversation", key="rp_clear_convo_btn"):
-            st.session_state.role_playing_messages = []
-            st.session_state.role_playing_conversation_history = []
+            clear_messages()
+            start_conversation_log()
             st.success("Role Playing Conversation cleared!")
 
 
+    if st.session_state.rp_pending_session is not None:
+        if not st.session_state.rp_pending_session["future"].done():
+            wait_for_pending_session()
+            return
+        finish_pending_session()
+
     if st.session_state.role_playing_session is None:
         st.info("Configure the scenario and start the role playing session using the sidebar.")
         return
 
+    role_names = st.session_state.rp_role_names
+
     chat_container = st.container()
     with chat_container:
-        for msg_idx, msg_data in enumerate(st.session_state.role_playing_messages):
-            role = msg_data['role']
-            content = msg_data['content']
-            if role == "user":
-                st.markdown(f'''<div class="message user-message"><b>{st.session_state.role_playing_session.user_role_name}</b>: {content}</div>''', 
-                            unsafe_allow_html=True)
-            else: # assistant
-                st.markdown(f'''<div class="message assistant-message"><b>{st.session_state.role_playing_session.assistant_role_name}</b>: {content}</div>''', 
-                            unsafe_allow_html=True)
+        older_slot, recent_slot, stream_slot = st.empty(), st.empty(), st.empty()
+    draw_chat(older_slot, recent_slot)
 
     user_input = st.chat_input("Your message to the AI assistant...", key="rp_user_input")
 
     if user_input:
-        st.session_state.role_playing_messages.append({"role": "user", "content": user_input})
-        st.session_state.role_playing_conversation_history.append({"role": st.session_state.role_playing_session.user_role_name, "content": user_input})
+        from camel.messages import BaseMessage
+
+        append_message("user", user_input)
+        append_history(role_names["user"], user_input)
+        draw_chat(older_slot, recent_slot)
         
         try:
-            assistant_response_message, _ = st.session_state.role_playing_session.step(
+            session = st.session_state.role_playing_session
+            trim_agent_memory(session.user_agent)
+            trim_agent_memory(session.assistant_agent)
+            assistant_response, _ = stream_step_session(
+                session,
                 BaseMessage.make_user_message(
-                    role_name=st.session_state.role_playing_session.user_role_name,
+                    role_name=role_names["user"],
                     content=user_input
-                )
+                ),
+                stream_slot,
+                role_names["assistant"],
+                st.session_state.rp_session_provider
             )
-            if assistant_response_message:
-                assistant_response_content = assistant_response_message.content
-                st.session_state.role_playing_messages.append({"role": "assistant", "content": assistant_response_content})
-                st.session_state.role_playing_conversation_history.append({"role": st.session_state.role_playing_session.assistant_role_name, "content": assistant_response_content})
+            if assistant_response.msgs:
+                assistant_response_content = assistant_response.msgs[0].content
+                append_message("assistant", assistant_response_content)
+                append_history(role_names["assistant"], assistant_response_content)
+                # Update the chat in place instead of rerunning the whole page
+                draw_chat(older_slot, recent_slot)
+                stream_slot.empty()
             else:
                 st.warning("Assistant did not provide a response.")
-            st.rerun()
         except Exception as e:
             st.error(f"Error during role playing step: {str(e)}")
 
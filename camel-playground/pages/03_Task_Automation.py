@@ -1,18 +1,34 @@
 import streamlit as st
+import asyncio
+import concurrent.futures
+import gzip
+import hashlib
+import inspect
+import math
 import os
-from camel.agents import ChatAgent
-from camel.messages import BaseMessage
-from camel.types import ModelType, ModelPlatformType
-from camel.models import ModelFactory
-import plotly.graph_objects as go
+import sqlite3
+import threading
+from types import MappingProxyType
+from uuid import uuid4
+import pandas as pd
 from datetime import datetime
-import json
+import orjson
 from pathlib import Path
 import time
 import logging
+from utils.model_clients import create_model, event_loop, key_fingerprint, wait_timeout
 
-# Configure basic logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+def _log_level(value: str) -> int:
+    """LOG_LEVEL as a logging level: a level name or number, else WARNING."""
+    value = value.strip().upper()
+    if value.isdigit():
+        return int(value)
+    level = logging.getLevelName(value)
+    # getLevelName returns a "Level ..." string for names it doesn't know
+    return level if isinstance(level, int) else logging.WARNING
+
+# Configure basic logging; set LOG_LEVEL=INFO to see the per-task trace
+logging.basicConfig(level=_log_level(os.environ.get("LOG_LEVEL", "WARNING")), format='%(asctime)s - %(levelname)s - %(message)s')
 
 # Configure the page
 st.set_page_config(
@@ -48,27 +64,74 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
+# Saved task results and the task reply cache
+TASK_HISTORY_DIR = Path("task_history")
+TASK_DB_PATH = TASK_HISTORY_DIR / "task_automation.db"
+
+# Replies to the same task on an identically configured agent are reused for this long
+TASK_CACHE_TTL = 24 * 3600
+
+# Execute All Pending runs at most this many tasks at once
+TASK_CONCURRENCY = 5
+
+# Columns of the task table; rows are indexed by a short random id. Full outputs live in
+# SQLite, the table keeps only their first TASK_PREVIEW_CHARS characters
+TASK_COLUMNS = ["description", "status", "preview", "created_at"]
+TASK_PREVIEW_CHARS = 100
+
+def _empty_task_table():
+    return pd.DataFrame(columns=TASK_COLUMNS, index=pd.Index([], name="id"))
+
+# provider prefix -> (ModelPlatformType member, API key env var, provider name shown to the user).
+# Platforms are named rather than imported so the page renders before CAMEL is loaded
+PROVIDER_PREFIX_MAP = MappingProxyType({
+    "openai": ("OPENAI", "OPENAI_API_KEY", "OpenAI"),
+    "anthropic": ("ANTHROPIC", "ANTHROPIC_API_KEY", "Anthropic"),
+    "gemini": ("GEMINI", "GEMINI_API_KEY", "Gemini"),
+    "openrouter": ("OPENROUTER", "OPENROUTER_API_KEY", "OpenRouter"),
+})
+
+# Short model names accepted without a prefix -> (ModelType member, fallback model name, provider prefix)
+INFERRED_MODEL_MAP = MappingProxyType({
+    "gpt-4": ("GPT_4", "gpt-4", "openai"),
+    "gpt-3.5-turbo": ("GPT_3_5_TURBO", "gpt-3.5-turbo", "openai"),
+    "gpt-3.5": ("GPT_3_5_TURBO", "gpt-3.5-turbo", "openai"),
+    "claude-2": ("CLAUDE_2_1", "claude-2.1", "anthropic"),
+})
+
 def initialize_session_state():
     if 'agent' not in st.session_state:
         st.session_state.agent = None
-    if 'tasks' not in st.session_state:
-        st.session_state.tasks = []
-    if 'task_outputs' not in st.session_state:
-        st.session_state.task_outputs = {}
-    if 'task_status' not in st.session_state:
-        st.session_state.task_status = {}
+    if 'tasks_df' not in st.session_state:
+        st.session_state.tasks_df = _empty_task_table()
     if 'model_name_input' not in st.session_state:
         st.session_state.model_name_input = "gpt-3.5-turbo"
+    if 'agent_settings' not in st.session_state:
+        st.session_state.agent_settings = None
+
+@st.cache_resource(show_spinner=False)
+def _agent_stream_kwargs():
+    """ChatAgent kwargs so streamed chunks carry the text so far.
+
+    Newer CAMEL releases default to deltas and need stream_accumulate=True.
+    """
+    from camel.agents import ChatAgent
+    if "stream_accumulate" in inspect.signature(ChatAgent.__init__).parameters:
+        return {"stream_accumulate": True}
+    return {}
 
 def create_agent_for_task_automation(model_name_input: str, role: str, role_description: str, agent_identifier: str = "Task Agent"):
+    from camel.agents import ChatAgent
+    from camel.types import ModelType, ModelPlatformType
+
     model_instance = None
     model_name_input_stripped = model_name_input.strip()
     
-    logging.info(f"Attempting to create {agent_identifier}: Input='{model_name_input_stripped}', Role='{role}'")
+    logging.info("Attempting to create %s: Input='%s', Role='%s'", agent_identifier, model_name_input_stripped, role)
 
     if not model_name_input_stripped:
         st.error(f"Model input for {agent_identifier} cannot be empty.")
-        logging.error(f"Validation failed for {agent_identifier}: Model input empty.")
+        logging.error("Validation failed for %s: Model input empty.", agent_identifier)
         return None
     
     platform_to_pass = None
@@ -76,7 +139,8 @@ def create_agent_for_task_automation(model_name_input: str, role: str, role_desc
     api_key_env_var = None
     api_key_name_for_user = "Selected Provider"
     provider_for_logging = "Unknown"
-    model_config = {"max_tokens": 4096}
+    # Streamed so single task runs can show their output as it arrives
+    model_config = {"max_tokens": 4096, "stream": True}
 
     try:
         if ":" in model_name_input_stripped:
@@ -87,97 +151,318 @@ def create_agent_for_task_automation(model_name_input: str, role: str, role_desc
 
             if not model_name_from_input:
                 st.error(f"Model name missing after prefix '{provider_from_input}:' for {agent_identifier}.")
-                logging.error(f"Validation failed for {agent_identifier}: Model name missing after prefix '{provider_from_input}:' (Input: '{model_name_input_stripped}')")
+                logging.error("Validation failed for %s: Model name missing after prefix '%s:' (Input: '%s')", agent_identifier, provider_from_input, model_name_input_stripped)
                 return None
             model_spec_to_pass = model_name_from_input
 
-            if provider_from_input == "openai":
-                platform_to_pass = ModelPlatformType.OPENAI
-                api_key_env_var = "OPENAI_API_KEY"; api_key_name_for_user = "OpenAI"
-            elif provider_from_input == "anthropic":
-                platform_to_pass = ModelPlatformType.ANTHROPIC
-                api_key_env_var = "ANTHROPIC_API_KEY"; api_key_name_for_user = "Anthropic"
-            elif provider_from_input == "gemini":
-                platform_to_pass = ModelPlatformType.GEMINI
-                api_key_env_var = "GEMINI_API_KEY"; api_key_name_for_user = "Gemini"
-            elif provider_from_input == "openrouter":
-                platform_to_pass = ModelPlatformType.OPENROUTER
-                api_key_env_var = "OPENROUTER_API_KEY"; api_key_name_for_user = "OpenRouter"
-            else:
+            provider_info = PROVIDER_PREFIX_MAP.get(provider_from_input)
+            if provider_info is None:
                 st.error(f"Unknown provider prefix '{provider_from_input}' in '{model_name_input_stripped}' for {agent_identifier}.")
-                logging.error(f"Unknown provider prefix '{provider_from_input}' for {agent_identifier} (Input: '{model_name_input_stripped}')")
+                logging.error("Unknown provider prefix '%s' for %s (Input: '%s')", provider_from_input, agent_identifier, model_name_input_stripped)
                 return None
+            platform_name, api_key_env_var, api_key_name_for_user = provider_info
+            platform_to_pass = ModelPlatformType[platform_name]
         else:
             provider_for_logging = "Inferred (OpenAI/Anthropic based on model name)"
-            lower_input = model_name_input_stripped.lower()
-            if lower_input == "gpt-4":
-                model_spec_to_pass = ModelType.GPT_4
-                platform_to_pass = ModelPlatformType.OPENAI
-                api_key_env_var = "OPENAI_API_KEY"; api_key_name_for_user = "OpenAI"
-            elif lower_input in ["gpt-3.5-turbo", "gpt-3.5"]:
-                model_spec_to_pass = ModelType.GPT_35_TURBO
-                platform_to_pass = ModelPlatformType.OPENAI
-                api_key_env_var = "OPENAI_API_KEY"; api_key_name_for_user = "OpenAI"
-            elif lower_input == "claude-2":
-                model_spec_to_pass = ModelType.CLAUDE_2
-                platform_to_pass = ModelPlatformType.ANTHROPIC
-                api_key_env_var = "ANTHROPIC_API_KEY"; api_key_name_for_user = "Anthropic"
-            else:
+            inferred = INFERRED_MODEL_MAP.get(model_name_input_stripped.lower())
+            if inferred is None:
                 st.error(f"Unknown model '{model_name_input_stripped}' for {agent_identifier}. No provider prefix found, and not a known short name (e.g., gpt-4, claude-2). Use format 'provider:model_name' like 'openrouter:google/gemini-flash-1.5'.")
-                logging.error(f"Cannot infer provider for {agent_identifier} from model '{model_name_input_stripped}'. Needs prefix or known short name.")
+                logging.error("Cannot infer provider for %s from model '%s'. Needs prefix or known short name.", agent_identifier, model_name_input_stripped)
                 return None
+            model_type_member, fallback_model_name, provider_prefix = inferred
+            # ModelType members missing from this CAMEL version fall back to the plain model name
+            model_spec_to_pass = getattr(ModelType, model_type_member, fallback_model_name)
+            platform_name, api_key_env_var, api_key_name_for_user = PROVIDER_PREFIX_MAP[provider_prefix]
+            platform_to_pass = ModelPlatformType[platform_name]
             
-        api_key_present = bool(os.getenv(api_key_env_var))
-        logging.info(f"{agent_identifier} - Parsed Provider: {provider_for_logging}, Platform to pass: {platform_to_pass}, Model spec: {model_spec_to_pass}, API Key ({api_key_env_var}) Present: {api_key_present}, Model Config: {model_config}")
+        api_key = os.getenv(api_key_env_var) if api_key_env_var else None
+        api_key_present = bool(api_key)
+        logging.info("%s - Parsed Provider: %s, Platform to pass: %s, Model spec: %s, API Key (%s) Present: %s, Model Config: %s", agent_identifier, provider_for_logging, platform_to_pass, model_spec_to_pass, api_key_env_var, api_key_present, model_config)
 
         if api_key_env_var and not api_key_present:
             st.error(f"{api_key_name_for_user} API Key not set for {agent_identifier}. Configure on Home page.")
-            logging.error(f"{api_key_name_for_user} API Key not set for {agent_identifier} (Env Var: {api_key_env_var})")
+            logging.error("%s API Key not set for %s (Env Var: %s)", api_key_name_for_user, agent_identifier, api_key_env_var)
             return None
 
-        logging.info(f"Calling ModelFactory.create for {agent_identifier} with platform='{platform_to_pass}', type='{model_spec_to_pass}' (is ModelType: {isinstance(model_spec_to_pass, ModelType)}), config='{model_config}'")
-        if platform_to_pass and not isinstance(model_spec_to_pass, ModelType):
-            model_instance = ModelFactory.create(model_platform=platform_to_pass, model_type=model_spec_to_pass, api_key=os.getenv(api_key_env_var), model_config_dict=model_config)
-        elif isinstance(model_spec_to_pass, ModelType):
-            model_instance = ModelFactory.create(model_type=model_spec_to_pass, api_key=os.getenv(api_key_env_var), model_config_dict=model_config)
+        logging.info("Calling ModelFactory.create for %s with platform='%s', type='%s' (is ModelType: %s), config='%s'", agent_identifier, platform_to_pass, model_spec_to_pass, isinstance(model_spec_to_pass, ModelType), model_config)
+        if platform_to_pass:
+            model_instance = create_model(platform_to_pass, model_spec_to_pass, model_config, api_key_env_var, key_fingerprint(api_key))
         else:
             st.error(f"Could not determine how to create model for {agent_identifier} with input '{model_name_input_stripped}'. Ambiguous configuration.")
-            logging.error(f"Ambiguous model creation for {agent_identifier}: input='{model_name_input_stripped}', platform_to_pass='{platform_to_pass}', model_spec='{model_spec_to_pass}'")
+            logging.error("Ambiguous model creation for %s: input='%s', platform_to_pass='%s', model_spec='%s'", agent_identifier, model_name_input_stripped, platform_to_pass, model_spec_to_pass)
             return None
 
         if model_instance is None:
             st.error(f"Failed to create model for {agent_identifier} with input \'{model_name_input_stripped}\'. Check format/name & API keys. See logs.")
-            logging.error(f"ModelFactory.create returned None for {agent_identifier}. Input='{model_name_input_stripped}', Platform='{platform_to_pass}', ModelSpec='{model_spec_to_pass}'")
+            logging.error("ModelFactory.create returned None for %s. Input='%s', Platform='%s', ModelSpec='%s'", agent_identifier, model_name_input_stripped, platform_to_pass, model_spec_to_pass)
             return None
         
-        logging.info(f"Model instance created successfully for {agent_identifier}. Now creating ChatAgent.")
-        agent = ChatAgent(system_message=f"You are a {role}. {role_description}", model=model_instance)
-        logging.info(f"ChatAgent (type: {type(agent)}) created for {agent_identifier}.")
+        logging.info("Model instance created successfully for %s. Now creating ChatAgent.", agent_identifier)
+        agent = ChatAgent(system_message=f"You are a {role}. {role_description}", model=model_instance, **_agent_stream_kwargs())
+        logging.info("ChatAgent (type: %s) created for %s.", type(agent), agent_identifier)
         return agent
 
     except ValueError as ve:
         st.error(f"Configuration error creating {agent_identifier} with input '{model_name_input_stripped}': {str(ve)}. Check format and names. See logs.")
-        logging.error(f"ValueError during {agent_identifier} creation: {str(ve)}. Input='{model_name_input_stripped}', Platform='{platform_to_pass}', ModelSpec='{model_spec_to_pass}'", exc_info=True)
+        logging.error("ValueError during %s creation: %s. Input='%s', Platform='%s', ModelSpec='%s'", agent_identifier, ve, model_name_input_stripped, platform_to_pass, model_spec_to_pass, exc_info=True)
         return None
     except Exception as e:
         st.error(f"Unexpected error creating {agent_identifier} with input '{model_name_input_stripped}': {str(e)}. See logs for details.")
-        logging.error(f"Unexpected exception during {agent_identifier} creation: {str(e)}. Input='{model_name_input_stripped}', Platform='{platform_to_pass}', ModelSpec='{model_spec_to_pass}'", exc_info=True)
+        logging.error("Unexpected exception during %s creation: %s. Input='%s', Platform='%s', ModelSpec='%s'", agent_identifier, e, model_name_input_stripped, platform_to_pass, model_spec_to_pass, exc_info=True)
+        return None
+
+@st.cache_resource(show_spinner=False)
+def _task_db():
+    """SQLite connection shared by every session, and the lock that serializes its use."""
+    TASK_HISTORY_DIR.mkdir(exist_ok=True)
+    conn = sqlite3.connect(TASK_DB_PATH, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("CREATE TABLE IF NOT EXISTS reply_cache (key TEXT PRIMARY KEY, reply TEXT NOT NULL, stored_at REAL NOT NULL)")
+    conn.execute("CREATE TABLE IF NOT EXISTS task_outputs (id TEXT PRIMARY KEY, task TEXT NOT NULL, output TEXT NOT NULL, status TEXT NOT NULL, ts INTEGER NOT NULL)")
+    conn.commit()
+    return threading.Lock(), conn
+
+def _task_cache_key(agent_settings, task_input: str) -> str:
+    """Digest of the agent's model, role and description plus the task prompt."""
+    return hashlib.sha256(orjson.dumps([agent_settings, task_input], option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+def _cached_task_reply(cache_key: str):
+    lock, conn = _task_db()
+    with lock:
+        row = conn.execute("SELECT reply, stored_at FROM reply_cache WHERE key = ?", (cache_key,)).fetchone()
+    if row is None or time.time() - row[1] > TASK_CACHE_TTL:
         return None
+    return row[0]
+
+def _store_task_reply(cache_key: str, reply: str):
+    lock, conn = _task_db()
+    with lock:
+        conn.execute("INSERT OR REPLACE INTO reply_cache (key, reply, stored_at) VALUES (?, ?, ?)", (cache_key, reply, time.time()))
+        conn.commit()
+
+def _store_task_output(task_id: str, task_item: str, output: str, status: str):
+    lock, conn = _task_db()
+    with lock:
+        conn.execute(
+            "INSERT OR REPLACE INTO task_outputs (id, task, output, status, ts) VALUES (?, ?, ?, ?, ?)",
+            (task_id, task_item, output, status, int(time.time()))
+        )
+        conn.commit()
+
+def load_task_outputs(task_ids) -> dict:
+    """Full outputs of the given tasks by id, in one query."""
+    task_ids = list(task_ids)
+    if not task_ids:
+        return {}
+    lock, conn = _task_db()
+    with lock:
+        rows = conn.execute(
+            f"SELECT id, output FROM task_outputs WHERE id IN ({','.join('?' * len(task_ids))})", task_ids
+        ).fetchall()
+    return dict(rows)
 
-def save_task_results(tasks, outputs, status, model_name_input_val):
-    save_dir = Path("task_history")
-    save_dir.mkdir(exist_ok=True)
+def delete_task_outputs(task_ids):
+    task_ids = list(task_ids)
+    lock, conn = _task_db()
+    with lock:
+        conn.executemany("DELETE FROM task_outputs WHERE id = ?", [(task_id,) for task_id in task_ids])
+        conn.commit()
+
+def _record_task_turn(agent, user_message, reply: str):
+    """Add a task answered without agent.step (cached or run on a clone) to the agent's memory."""
+    from camel.messages import BaseMessage
+    from camel.types import OpenAIBackendRole
+    agent.update_memory(user_message, OpenAIBackendRole.USER)
+    agent.record_message(BaseMessage.make_assistant_message(role_name="Assistant", content=reply))
+
+def add_task(description: str):
+    """Append a pending task under a new id; the same description can be added more than once."""
+    st.session_state.tasks_df.loc[uuid4().hex[:8]] = [description, "pending", None, time.time()]
+
+def set_task_status(task_id: str, status: str, output: str = None):
+    """Update a task's status; an output is written to SQLite and only its preview kept here."""
+    tasks_df = st.session_state.tasks_df
+    tasks_df.at[task_id, "status"] = status
+    if output is not None:
+        _store_task_output(task_id, tasks_df.at[task_id, "description"], output, status)
+        tasks_df.at[task_id, "preview"] = output[:TASK_PREVIEW_CHARS]
+
+def task_prompt(task_item: str) -> str:
+    return f"Please complete this task: {task_item}"
+
+def task_message(task_item: str):
+    from camel.messages import BaseMessage
+    return BaseMessage.make_user_message(role_name="User", content=task_prompt(task_item))
+
+def apply_task_response(task_id: str, agent_response, cache_key: str):
+    """Store a task's output and status from the agent's response, caching a successful reply."""
+    task_item = st.session_state.tasks_df.at[task_id, "description"]
+    if agent_response and agent_response.msgs:
+        response_content = agent_response.msgs[0].content
+        logging.info("Extracted response content for task '%s': '%s'", task_item, response_content)
+        set_task_status(task_id, "completed", response_content)
+        _store_task_reply(cache_key, response_content)
+    elif agent_response and not agent_response.msgs:
+        logging.warning("Agent response for task '%s' received, but no messages.", task_item)
+        set_task_status(task_id, "completed_no_output", "Agent processed task but returned no message content.")
+    else:
+        logging.warning("Agent did not return a valid response for task '%s'.", task_item)
+        set_task_status(task_id, "error_no_response", "Agent did not provide a response.")
+
+async def _run_tasks(agents, user_messages, responses):
+    """astep each message on its own agent, at most TASK_CONCURRENCY at a time.
+
+    Each response, or the exception it raised, is stored in responses at its index
+    as it arrives, so the finished ones are kept if the rest get cancelled.
+    """
+    semaphore = asyncio.Semaphore(TASK_CONCURRENCY)
+
+    async def run(index, agent, user_message):
+        async with semaphore:
+            try:
+                response = await agent.astep(user_message)
+                # A streaming agent's astep returns the stream; awaiting it gives the final response
+                if inspect.isawaitable(response):
+                    response = await response
+                responses[index] = response
+            except Exception as e:
+                responses[index] = e
+
+    await asyncio.gather(*(run(index, agent, msg) for index, (agent, msg) in enumerate(zip(agents, user_messages))))
+
+def execute_pending_tasks():
+    """Run every pending task concurrently, answering repeats from the reply cache.
+
+    Each task runs on a clone of the agent holding the history so far, so the tasks
+    don't interleave in one memory; once all have finished, the cached and executed
+    turns are added to the agent in task order.
+    """
+    agent = st.session_state.agent
+    tasks_df = st.session_state.tasks_df
+    # (position in tasks_df, user message, reply) for every turn to add to the agent
+    turns = []
+    to_run = []
+    for position, (task_id, task_item) in enumerate(tasks_df.loc[tasks_df["status"] == "pending", "description"].items()):
+        user_message = task_message(task_item)
+        cache_key = _task_cache_key(st.session_state.agent_settings, user_message.content)
+        cached_reply = _cached_task_reply(cache_key)
+        if cached_reply is not None:
+            logging.info("Task '%s' answered from the reply cache", task_item)
+            set_task_status(task_id, "completed", cached_reply)
+            turns.append((position, user_message, cached_reply))
+        else:
+            to_run.append((position, task_id, task_item, user_message, cache_key))
+
+    if to_run:
+        logging.info("Executing %s pending tasks concurrently", len(to_run))
+        # Cloned before any turn is recorded, so no task sees the ones after it
+        clones = [agent.clone(with_memory=True) for _ in to_run]
+        responses = [None] * len(to_run)
+        # Tasks start in waves of TASK_CONCURRENCY, each allowed the full model timeout
+        timeout = wait_timeout(math.ceil(len(to_run) / TASK_CONCURRENCY))
+        future = asyncio.run_coroutine_threadsafe(
+            _run_tasks(clones, [user_message for _, _, _, user_message, _ in to_run], responses),
+            event_loop()
+        )
+        try:
+            future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            # A hung provider or stalled connection must not hold the script thread
+            future.cancel()
+            logging.error("Task execution timed out after %.0fs", timeout)
+            responses = [
+                TimeoutError(f"no response within {timeout:.0f}s") if response is None else response
+                for response in responses
+            ]
+
+        for (position, task_id, task_item, user_message, cache_key), agent_response in zip(to_run, responses):
+            if isinstance(agent_response, Exception):
+                logging.error("Exception executing task '%s': %s", task_item, agent_response, exc_info=agent_response)
+                set_task_status(task_id, "error_execution", f"Error executing task '{task_item[:30]}...': {str(agent_response)}")
+                continue
+            apply_task_response(task_id, agent_response, cache_key)
+            if agent_response and agent_response.msgs:
+                turns.append((position, user_message, agent_response.msgs[0].content))
+
+    for _, user_message, reply in sorted(turns, key=lambda turn: turn[0]):
+        _record_task_turn(agent, user_message, reply)
+
+def save_task_results(tasks_df, model_name_input_val):
+    TASK_HISTORY_DIR.mkdir(exist_ok=True)
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = save_dir / f"tasks_{timestamp}.json"
+    filename = TASK_HISTORY_DIR / f"tasks_{timestamp}.json.gz"
+    # Outputs and statuses are keyed by task id; task_ids lines up with tasks
     task_data = {
         "timestamp": timestamp,
         "model_name_input": model_name_input_val,
-        "tasks": tasks,
-        "outputs": outputs,
-        "status": status
+        "tasks": tasks_df["description"].tolist(),
+        "task_ids": tasks_df.index.tolist(),
+        "outputs": load_task_outputs(tasks_df.index[tasks_df["preview"].notna()]),
+        "status": tasks_df["status"].to_dict()
     }
-    with open(filename, 'w') as f:
-        json.dump(task_data, f, indent=2)
+    # Written under a temporary name and renamed, so readers never see a partial file
+    tmp_filename = filename.with_name(filename.name + ".tmp")
+    with gzip.open(tmp_filename, "wb", compresslevel=1) as f:
+        f.write(orjson.dumps(task_data, option=orjson.OPT_INDENT_2))
+    tmp_filename.replace(filename)
+
+@st.fragment
+def _task_row(task_id: str):
+    """One task card, rerun on its own; once Execute changes the task's status the whole page reruns."""
+    task_item = st.session_state.tasks_df.at[task_id, "description"]
+    with st.container():
+        col1, col2, col3 = st.columns([3,1,1])
+        output_slot = st.empty()
+        with col1: st.markdown(f"**Task:** {task_item}")
+        # The click is handled before the badge is drawn, so the card never shows a stale status
+        execute_slot = col3.empty()
+        if st.session_state.tasks_df.at[task_id, "status"] == "pending":
+            if execute_slot.button("Execute", key=f"exec_task_{task_id}"):
+                execute_slot.empty()
+                task_input_content = task_prompt(task_item)
+                logging.info("Executing task: '%s'. Agent input: '%s'", task_item, task_input_content)
+                try:
+                    set_task_status(task_id, "in_progress")
+                    
+                    logging.info("Sending message to agent (type: %s). Content: '%s'", type(st.session_state.agent), task_input_content)
+                    user_message = task_message(task_item)
+                    logging.info("Prepared BaseMessage for task: %s", user_message)
+
+                    cache_key = _task_cache_key(st.session_state.agent_settings, task_input_content)
+                    cached_reply = _cached_task_reply(cache_key)
+                    if cached_reply is not None:
+                        logging.info("Task '%s' answered from the reply cache", task_item)
+                        _record_task_turn(st.session_state.agent, user_message, cached_reply)
+                        set_task_status(task_id, "completed", cached_reply)
+                        output_slot.markdown(cached_reply)
+                    else:
+                        agent_response = st.session_state.agent.step(user_message)
+                        # Show the output as it streams; the response keeps the final message
+                        for chunk in agent_response:
+                            if chunk.msgs:
+                                output_slot.markdown(chunk.msgs[0].content)
+                        logging.info("Raw agent response for task '%s': %s", task_item, agent_response)
+                        apply_task_response(task_id, agent_response, cache_key)
+                except AttributeError as ae:
+                    error_msg = f"Method not found on agent: {str(ae)}. Task: '{task_item}'"
+                    output_slot.error(error_msg)
+                    logging.error("AttributeError for task '%s': %s. Agent type: %s", task_item, ae, type(st.session_state.agent), exc_info=True)
+                    set_task_status(task_id, "error_attribute", error_msg)
+                except Exception as e:
+                    error_msg = f"Error executing task '{task_item[:30]}...': {str(e)}"
+                    output_slot.error(error_msg)
+                    logging.error("Exception executing task '%s': %s. Agent type: %s", task_item, e, type(st.session_state.agent), exc_info=True)
+                    set_task_status(task_id, "error_execution", error_msg)
+                # Task Outputs, Task Statistics and Execute All Pending are drawn outside this fragment
+                if st.session_state.tasks_df.at[task_id, "status"] != "pending":
+                    st.rerun()
+        with col2:
+            status = st.session_state.tasks_df.at[task_id, "status"]
+            if status == "pending": st.warning("Pending")
+            elif status == "in_progress": st.info("In Progress")
+            elif status == "completed": st.success("Completed")
+            else: st.error(f"Failed ({status})") 
 
 def main():
     initialize_session_state()
@@ -206,6 +491,7 @@ def main():
                 role_description, 
                 "Task Automation Agent"
             )
+            st.session_state.agent_settings = (st.session_state.model_name_input.strip(), role, role_description)
             if st.session_state.agent:
                 st.success(f"Agent ({st.session_state.model_name_input}) created successfully as a {role}!")
             else:
@@ -213,18 +499,14 @@ def main():
         
         st.divider()
         if st.button("Save Results"):
-            if st.session_state.tasks:
-                save_task_results(
-                    st.session_state.tasks, st.session_state.task_outputs,
-                    st.session_state.task_status, st.session_state.model_name_input
-                )
+            if not st.session_state.tasks_df.empty:
+                save_task_results(st.session_state.tasks_df, st.session_state.model_name_input)
                 st.success("Task results saved!")
             else: st.warning("No tasks to save!")
         
         if st.button("Clear All"):
-            st.session_state.tasks = []
-            st.session_state.task_outputs = {}
-            st.session_state.task_status = {}
+            delete_task_outputs(st.session_state.tasks_df.index)
+            st.session_state.tasks_df = _empty_task_table()
             st.success("All tasks cleared!")
     
     if st.session_state.agent is None:
@@ -235,83 +517,39 @@ def main():
         new_task_description = st.text_area("Task Description", key="new_task_desc_input")
         if st.button("Add Task"):
             if new_task_description:
-                st.session_state.tasks.append(new_task_description)
-                st.session_state.task_status[new_task_description] = "pending"
+                add_task(new_task_description)
                 st.success("Task added successfully!")
                 st.rerun() 
             else:
                 st.error("Please enter a task description!")
     
-    if st.session_state.tasks:
+    tasks_df = st.session_state.tasks_df
+    if not tasks_df.empty:
         st.subheader("Tasks Overview")
-        for task_item in list(st.session_state.tasks): 
-            with st.container():
-                col1, col2, col3 = st.columns([3,1,1])
-                with col1: st.markdown(f"**Task:** {task_item}")
-                with col2:
-                    status = st.session_state.task_status.get(task_item, "pending")
-                    if status == "pending": st.warning("Pending")
-                    elif status == "in_progress": st.info("In Progress")
-                    elif status == "completed": st.success("Completed")
-                    else: st.error(f"Failed ({status})") 
-                with col3:
-                    if status == "pending":
-                        if st.button("Execute", key=f"exec_task_{task_item}"):
-                            task_input_content = f"Please complete this task: {task_item}"
-                            logging.info(f"Executing task: '{task_item}'. Agent input: '{task_input_content}'")
-                            try:
-                                st.session_state.task_status[task_item] = "in_progress"
-                                st.rerun()
-                                
-                                logging.info(f"Sending message to agent (type: {type(st.session_state.agent)}). Content: '{task_input_content}'")
-                                user_message = BaseMessage.make_user_message(role_name="User", content=task_input_content)
-                                logging.info(f"Prepared BaseMessage for task: {user_message}")
-
-                                agent_response = st.session_state.agent.step(user_message)
-                                logging.info(f"Raw agent response for task '{task_item}': {agent_response}")
-                                
-                                if agent_response and agent_response.msgs:
-                                    response_content = agent_response.msgs[0].content
-                                    logging.info(f"Extracted response content for task '{task_item}': '{response_content}'")
-                                    st.session_state.task_outputs[task_item] = response_content
-                                    st.session_state.task_status[task_item] = "completed"
-                                elif agent_response and not agent_response.msgs:
-                                    logging.warning(f"Agent response for task '{task_item}' received, but no messages.")
-                                    st.session_state.task_outputs[task_item] = "Agent processed task but returned no message content."
-                                    st.session_state.task_status[task_item] = "completed_no_output"
-                                else:
-                                    logging.warning(f"Agent did not return a valid response for task '{task_item}'.")
-                                    st.session_state.task_outputs[task_item] = "Agent did not provide a response."
-                                    st.session_state.task_status[task_item] = "error_no_response"
-                                
-                                st.rerun()
-                            except AttributeError as ae:
-                                error_msg = f"Method not found on agent: {str(ae)}. Task: '{task_item}'"
-                                st.error(error_msg)
-                                logging.error(f"AttributeError for task '{task_item}': {str(ae)}. Agent type: {type(st.session_state.agent)}", exc_info=True)
-                                st.session_state.task_status[task_item] = "error_attribute"
-                                st.session_state.task_outputs[task_item] = error_msg
-                                st.rerun()
-                            except Exception as e:
-                                error_msg = f"Error executing task '{task_item[:30]}...': {str(e)}"
-                                st.error(error_msg)
-                                logging.error(f"Exception executing task '{task_item}': {str(e)}. Agent type: {type(st.session_state.agent)}", exc_info=True)
-                                st.session_state.task_status[task_item] = "error_execution"
-                                st.session_state.task_outputs[task_item] = error_msg
-                                st.rerun()
-
-        if st.session_state.task_outputs:
+        if (tasks_df["status"] == "pending").any():
+            if st.button("⚡ Execute All Pending", key="exec_all_pending_btn"):
+                with st.spinner("Executing pending tasks..."):
+                    execute_pending_tasks()
+                st.rerun()
+        for task_id in tasks_df.index:
+            _task_row(task_id)
+
+        finished = tasks_df[tasks_df["preview"].notna()]
+        if not finished.empty:
             st.subheader("Task Outputs")
-            for task_key, output in st.session_state.task_outputs.items(): 
+            outputs = load_task_outputs(finished.index)
+            for task_id, task_key in finished["description"].items():
                 with st.expander(f"Output for: {task_key[:50]}..."):
-                    st.markdown(output)
+                    st.markdown(outputs.get(task_id, finished.at[task_id, "preview"]))
         
         st.subheader("Task Statistics")
-        total_tasks = len(st.session_state.tasks)
-        completed_tasks = list(st.session_state.task_status.values()).count("completed")
-        failed_tasks = sum(1 for s in st.session_state.task_status.values() if s not in ["pending", "in_progress", "completed"])
-        pending_tasks = list(st.session_state.task_status.values()).count("pending")
-        in_progress_tasks = list(st.session_state.task_status.values()).count("in_progress")
+        total_tasks = len(tasks_df)
+        # Every status that is not a known state is a failure
+        status_counts = tasks_df["status"].value_counts()
+        completed_tasks = int(status_counts.get("completed", 0))
+        pending_tasks = int(status_counts.get("pending", 0))
+        in_progress_tasks = int(status_counts.get("in_progress", 0))
+        failed_tasks = int(status_counts.drop(["pending", "in_progress", "completed"], errors="ignore").sum())
 
         stat_cols = st.columns(5)
         stat_cols[0].metric("Total", total_tasks)
@@ -321,19 +559,10 @@ def main():
         stat_cols[4].metric("Failed/Error", failed_tasks)
         
         if total_tasks > 0:
-            fig = go.Figure(data=[
-                go.Bar(
-                    x=['Completed', 'Pending', 'In Progress', 'Failed/Error'],
-                    y=[completed_tasks, pending_tasks, in_progress_tasks, failed_tasks],
-                    marker_color=['#00cc96', '#636efa', '#ffa15a', '#ef553b']
-                )
-            ])
-            fig.update_layout(
-                title="Task Status Distribution",
-                xaxis_title="Status",
-                yaxis_title="Number of Tasks"
+            st.bar_chart(
+                pd.Series({"Completed": completed_tasks, "Pending": pending_tasks, "In Progress": in_progress_tasks, "Failed/Error": failed_tasks}, name="Tasks"),
+                x_label="Status", y_label="Number of Tasks"
             )
-            st.plotly_chart(fig)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
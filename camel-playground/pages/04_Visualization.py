@@ -1,11 +1,14 @@
 import streamlit as st
 import plotly.graph_objects as go
-import plotly.express as px
+from plotly.subplots import make_subplots
 import pandas as pd
-import json
+import gzip
+import os
+import threading
+import orjson
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
 from pathlib import Path
-import seaborn as sns
-import matplotlib.pyplot as plt
 from datetime import datetime
 import numpy as np
 
@@ -35,89 +38,156 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-def load_conversation_history():
-    history_dir = Path("conversation_history")
+# History is reloaded at least this often, and at once when files are added or removed
+HISTORY_CACHE_TTL = 60
+HISTORY_LOAD_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+def _dir_signature(history_dir: Path):
+    """Directory mtime, which changes whenever a history file is added or removed."""
+    return history_dir.stat().st_mtime_ns if history_dir.exists() else None
+
+def _load_history_file(path: Path):
+    data = path.read_bytes()
+    return orjson.loads(gzip.decompress(data) if path.suffix == ".gz" else data)
+
+@st.cache_resource(show_spinner=False)
+def _history_index():
+    """Parsed history files by directory, {dir_name: {path: (stat key, record)}}, and its lock."""
+    return threading.Lock(), {}
+
+@st.cache_data(ttl=HISTORY_CACHE_TTL, show_spinner=False)
+def _load_history(dir_name: str, dir_signature):
+    history_dir = Path(dir_name)
     if not history_dir.exists():
         return []
     
-    conversations = []
-    for file in history_dir.glob("*.json"):
-        with open(file, 'r') as f:
-            conversations.append(json.load(f))
-    return conversations
+    lock, index = _history_index()
+    with lock:
+        known = index.get(dir_name, {})
+        current, changed = {}, []
+        for path in chain(history_dir.glob("*.json"), history_dir.glob("*.json.gz")):
+            stat = path.stat()
+            stat_key = (stat.st_mtime_ns, stat.st_size)
+            entry = known.get(path)
+            if entry is None or entry[0] != stat_key:
+                changed.append(path)
+            current[path] = (stat_key, entry[1] if entry else None)
+        
+        # Only new or rewritten files are parsed; reads are I/O bound, so they run on a thread pool
+        if changed:
+            with ThreadPoolExecutor(max_workers=HISTORY_LOAD_WORKERS) as executor:
+                for path, record in zip(changed, executor.map(_load_history_file, changed)):
+                    current[path] = (current[path][0], record)
+        index[dir_name] = current
+    return [record for _, record in current.values()]
+
+def load_conversation_history():
+    return _load_history("conversation_history", _dir_signature(Path("conversation_history")))
 
 def load_role_play_history():
-    history_dir = Path("role_play_history")
-    if not history_dir.exists():
-        return []
-    
-    sessions = []
-    for file in history_dir.glob("*.json"):
-        with open(file, 'r') as f:
-            sessions.append(json.load(f))
-    return sessions
+    return _load_history("role_play_history", _dir_signature(Path("role_play_history")))
 
 def load_task_history():
-    history_dir = Path("task_history")
-    if not history_dir.exists():
-        return []
-    
-    tasks = []
-    for file in history_dir.glob("*.json"):
-        with open(file, 'r') as f:
-            tasks.append(json.load(f))
-    return tasks
+    return _load_history("task_history", _dir_signature(Path("task_history")))
 
+def _record_index(groups):
+    """Position of the owning record for each item when the item lists are flattened in order."""
+    return np.repeat(np.arange(len(groups)), [len(items) for items in groups])
+
+def _record_fields(records, fields):
+    """Top-level fields of each record as a frame, one row per record."""
+    return pd.DataFrame({field: [record.get(field) for record in records] for field in fields})
+
+@st.cache_data(show_spinner=False)
 def analyze_conversation_stats(conversations):
     if not conversations:
         return pd.DataFrame()
     
-    stats = []
-    for conv in conversations:
-        message_count = len(conv.get('messages', []))
-        avg_length = np.mean([len(str(m.get('content', ''))) for m in conv.get('messages', [])])
-        stats.append({
-            'timestamp': conv.get('timestamp'),
-            'model': conv.get('model'),
-            'messages': message_count,
-            'avg_length': avg_length
-        })
-    return pd.DataFrame(stats)
+    # One flat frame of every message, tagged with the conversation it came from
+    messages = [conv.get('messages', []) for conv in conversations]
+    contents = pd.Series([m.get('content', '') for m in chain.from_iterable(messages)], dtype=object)
+    lengths = contents.map(str).str.len()
+    avg_length = lengths.groupby(_record_index(messages)).mean().reindex(range(len(conversations)))
+
+    stats = _record_fields(conversations, ['timestamp', 'model'])
+    stats['messages'] = [len(m) for m in messages]
+    stats['avg_length'] = avg_length.to_numpy()
+    return stats
 
+@st.cache_data(show_spinner=False)
 def analyze_role_play_stats(sessions):
     if not sessions:
         return pd.DataFrame()
     
-    stats = []
-    for session in sessions:
-        conversation = session.get('conversation', [])
-        agent1_messages = len([m for m in conversation if m.get('role') == 'agent1'])
-        agent2_messages = len([m for m in conversation if m.get('role') == 'agent2'])
-        stats.append({
-            'timestamp': session.get('timestamp'),
-            'agent1_role': session.get('agent1_role'),
-            'agent2_role': session.get('agent2_role'),
-            'agent1_messages': agent1_messages,
-            'agent2_messages': agent2_messages,
-            'total_messages': len(conversation)
-        })
-    return pd.DataFrame(stats)
+    conversations = [session.get('conversation', []) for session in sessions]
+    # Messages without a role are grouped under '' so the row sums are the session totals
+    roles = pd.DataFrame.from_records(list(chain.from_iterable(conversations)), columns=['role'])['role'].fillna('')
+    counts = (
+        roles.groupby([_record_index(conversations), roles]).size()
+        .unstack(fill_value=0)
+        .reindex(index=range(len(sessions)), fill_value=0)
+    )
+    agent_counts = counts.reindex(columns=['agent1', 'agent2'], fill_value=0)
 
+    stats = _record_fields(sessions, ['timestamp', 'agent1_role', 'agent2_role'])
+    stats['agent1_messages'] = agent_counts['agent1'].astype(int).to_numpy()
+    stats['agent2_messages'] = agent_counts['agent2'].astype(int).to_numpy()
+    # Sessions with no messages leave counts without columns, so the sums come out as floats
+    stats['total_messages'] = counts.sum(axis=1).astype(int).to_numpy()
+    return stats
+
+@st.cache_data(show_spinner=False)
 def analyze_task_stats(tasks):
     if not tasks:
         return pd.DataFrame()
     
-    stats = []
-    for task_set in tasks:
-        completed = len([s for s in task_set.get('status', {}).values() if s == 'completed'])
-        failed = len([s for s in task_set.get('status', {}).values() if s == 'failed'])
-        stats.append({
-            'timestamp': task_set.get('timestamp'),
-            'total_tasks': len(task_set.get('tasks', [])),
-            'completed_tasks': completed,
-            'failed_tasks': failed
-        })
-    return pd.DataFrame(stats)
+    statuses = [list(task_set.get('status', {}).values()) for task_set in tasks]
+    flat = pd.Series(list(chain.from_iterable(statuses)), dtype=object)
+    counts = (
+        flat.groupby([_record_index(statuses), flat]).size()
+        .unstack(fill_value=0)
+        .reindex(index=range(len(tasks)), columns=['completed', 'failed'], fill_value=0)
+    )
+
+    stats = _record_fields(tasks, ['timestamp'])
+    stats['total_tasks'] = [len(task_set.get('tasks', [])) for task_set in tasks]
+    stats['completed_tasks'] = counts['completed'].astype(int).to_numpy()
+    stats['failed_tasks'] = counts['failed'].astype(int).to_numpy()
+    return stats
+
+# Each tab draws its two charts as one figure with side-by-side subplots. Figures are
+# memoized on their input frames, so reruns that leave the data unchanged reuse them
+@st.cache_data(show_spinner=False)
+def _fig_conversations(conv_stats):
+    fig = make_subplots(rows=1, cols=2, subplot_titles=('Message Count Over Time', 'Message Length Distribution by Model'))
+    fig.add_trace(go.Scatter(x=conv_stats['timestamp'], y=conv_stats['messages'], mode='lines', name='messages'), row=1, col=1)
+    fig.add_trace(go.Box(x=conv_stats['model'], y=conv_stats['avg_length'], name='avg_length'), row=1, col=2)
+    fig.update_layout(showlegend=False)
+    return fig
+
+@st.cache_data(show_spinner=False)
+def _fig_role_play(role_stats, role_combinations):
+    fig = make_subplots(
+        rows=1, cols=2,
+        specs=[[{'type': 'xy'}, {'type': 'domain'}]],
+        subplot_titles=('Message Distribution Between Agents', 'Popular Role Combinations')
+    )
+    fig.add_trace(go.Bar(name='Agent 1', x=role_stats['timestamp'], y=role_stats['agent1_messages']), row=1, col=1)
+    fig.add_trace(go.Bar(name='Agent 2', x=role_stats['timestamp'], y=role_stats['agent2_messages']), row=1, col=1)
+    fig.add_trace(go.Pie(labels=role_combinations.index, values=role_combinations['Count'], name='Roles'), row=1, col=2)
+    fig.update_layout(barmode='stack')
+    return fig
+
+@st.cache_data(show_spinner=False)
+def _fig_tasks(task_stats):
+    success_rates = (task_stats['completed_tasks'] / task_stats['total_tasks'] * 100)
+    fig = make_subplots(rows=1, cols=2, subplot_titles=('Task Completion Rates Over Time', 'Distribution of Task Success Rates (%)'))
+    fig.add_trace(go.Scatter(x=task_stats['timestamp'], y=task_stats['completed_tasks'], mode='lines', name='completed_tasks'), row=1, col=1)
+    fig.add_trace(go.Scatter(x=task_stats['timestamp'], y=task_stats['failed_tasks'], mode='lines', name='failed_tasks'), row=1, col=1)
+    fig.add_trace(go.Histogram(x=success_rates, nbinsx=10, name='Success Rate (%)', showlegend=False), row=1, col=2)
+    fig.update_xaxes(title_text='Success Rate (%)', row=1, col=2)
+    fig.update_yaxes(title_text='Frequency', row=1, col=2)
+    return fig
 
 def main():
     st.title("📊 Visualization")
@@ -142,15 +212,8 @@ def main():
     with tab1:
         st.header("Conversation Analysis")
         if not conv_stats.empty:
-            # Message count over time
-            fig1 = px.line(conv_stats, x='timestamp', y='messages',
-                          title='Message Count Over Time')
-            st.plotly_chart(fig1)
-            
-            # Average message length by model
-            fig2 = px.box(conv_stats, x='model', y='avg_length',
-                         title='Message Length Distribution by Model')
-            st.plotly_chart(fig2)
+            # Message count over time and message length by model
+            st.plotly_chart(_fig_conversations(conv_stats))
             
             # Statistics summary
             col1, col2, col3 = st.columns(3)
@@ -163,22 +226,14 @@ def main():
     with tab2:
         st.header("Role Playing Analysis")
         if not role_stats.empty:
-            # Message distribution between agents
-            fig3 = go.Figure(data=[
-                go.Bar(name='Agent 1', x=role_stats['timestamp'], y=role_stats['agent1_messages']),
-                go.Bar(name='Agent 2', x=role_stats['timestamp'], y=role_stats['agent2_messages'])
-            ])
-            fig3.update_layout(title='Message Distribution Between Agents', barmode='stack')
-            st.plotly_chart(fig3)
-            
             # Role combinations
-            role_combinations = pd.DataFrame({
-                'Roles': role_stats['agent1_role'] + ' & ' + role_stats['agent2_role'],
-                'Count': 1
-            }).groupby('Roles').count()
-            fig4 = px.pie(role_combinations, values='Count', names=role_combinations.index,
-                         title='Popular Role Combinations')
-            st.plotly_chart(fig4)
+            role_combinations = (
+                (role_stats['agent1_role'] + ' & ' + role_stats['agent2_role'])
+                .rename('Roles').value_counts().sort_index().rename('Count').to_frame()
+            )
+            
+            # Message distribution between agents and popular role combinations
+            st.plotly_chart(_fig_role_play(role_stats, role_combinations))
             
             # Statistics summary
             col1, col2, col3 = st.columns(3)
@@ -191,17 +246,8 @@ def main():
     with tab3:
         st.header("Task Analysis")
         if not task_stats.empty:
-            # Task completion rates over time
-            fig5 = px.line(task_stats, x='timestamp', y=['completed_tasks', 'failed_tasks'],
-                          title='Task Completion Rates Over Time')
-            st.plotly_chart(fig5)
-            
-            # Success rate distribution
-            success_rates = (task_stats['completed_tasks'] / task_stats['total_tasks'] * 100)
-            fig6 = px.histogram(success_rates, nbins=10,
-                              title='Distribution of Task Success Rates (%)',
-                              labels={'value': 'Success Rate (%)', 'count': 'Frequency'})
-            st.plotly_chart(fig6)
+            # Task completion rates over time and success rate distribution
+            st.plotly_chart(_fig_tasks(task_stats))
             
             # Statistics summary
             col1, col2, col3 = st.columns(3)
@@ -215,7 +261,7 @@ def main():
     
     # Export functionality
     st.sidebar.header("Export Data")
-    export_format = st.sidebar.selectbox("Choose format:", ["CSV", "JSON"])
+    export_format = st.sidebar.selectbox("Choose format:", ["CSV", "JSON", "Parquet"])
     
     if st.sidebar.button("Export All Data"):
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -229,6 +275,12 @@ def main():
                 if not task_stats.empty:
                     task_stats.to_excel(writer, sheet_name="Tasks", index=False)
             st.sidebar.success("Data exported to Excel file!")
+        elif export_format == "Parquet":
+            # One zstd-compressed Parquet file per table
+            for name, stats in (("conversations", conv_stats), ("role_playing", role_stats), ("tasks", task_stats)):
+                if not stats.empty:
+                    stats.to_parquet(f"camel_analytics_{timestamp}_{name}.parquet", engine="pyarrow", compression="zstd", index=False)
+            st.sidebar.success("Data exported to Parquet files!")
         else:
             # Export to JSON
             export_data = {
@@ -236,8 +288,9 @@ def main():
                 "role_playing": role_stats.to_dict('records') if not role_stats.empty else [],
                 "tasks": task_stats.to_dict('records') if not task_stats.empty else []
             }
-            with open(f"camel_analytics_{timestamp}.json", 'w') as f:
-                json.dump(export_data, f, indent=2)
+            Path(f"camel_analytics_{timestamp}.json").write_bytes(
+                orjson.dumps(export_data, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY)
+            )
             st.sidebar.success("Data exported to JSON file!")
 
 if __name__ == "__main__":
@@ -0,0 +1,136 @@
+"""Model clients, connection pools and the event loop shared by the playground pages."""
+
+import asyncio
+import atexit
+import hashlib
+import importlib.util
+import inspect
+import logging
+import os
+import sys
+import threading
+
+import streamlit as st
+
+HTTP_LIMITS = dict(max_keepalive_connections=32, max_connections=64)
+# CAMEL's own SDK retry count; prebuilt clients don't get it unless passed explicitly
+MODEL_MAX_RETRIES = 3
+
+def model_timeout() -> float:
+    """Seconds a model call may take, from MODEL_TIMEOUT (CAMEL's own default is 180)."""
+    return float(os.environ.get("MODEL_TIMEOUT", 180))
+
+# Extra seconds a caller waits beyond the model timeout before giving up on calls still pending
+WAIT_TIMEOUT_MARGIN = 30
+
+def wait_timeout(rounds: int = 1) -> float:
+    """Seconds to wait for rounds back-to-back model calls before giving up on them."""
+    return model_timeout() * rounds + WAIT_TIMEOUT_MARGIN
+
+def key_fingerprint(api_key: str) -> str:
+    """Stands in for an API key in cache keys, so the key itself is never stored there."""
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+@st.cache_resource(show_spinner=False)
+def event_loop():
+    """Long-lived event loop on a daemon thread that runs every async model call.
+
+    The cached models keep their async clients between calls, and those clients'
+    keep-alive connections are bound to the loop they were opened on, so the calls
+    need one loop that stays open rather than a new asyncio.run() loop each time.
+    The loop is a uvloop one where uvloop is installed (it has no Windows build).
+    """
+    loop = None
+    if sys.platform != "win32":
+        try:
+            import uvloop
+            loop = uvloop.new_event_loop()
+        except ImportError:
+            pass
+    if loop is None:
+        loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="model-client-loop", daemon=True).start()
+    return loop
+
+@st.cache_resource(show_spinner=False)
+def shared_http_client():
+    """Pooled sync HTTP client for every OpenAI/Anthropic SDK client the pages build."""
+    import httpx
+    return httpx.Client(timeout=model_timeout(), limits=httpx.Limits(**HTTP_LIMITS))
+
+@st.cache_resource(show_spinner=False)
+def shared_async_http_client():
+    """Pooled async HTTP client for the async SDK clients.
+
+    Only ever used on event_loop(), so its connections stay bound to one loop.
+    HTTP/2 is on when the h2 package is installed.
+    """
+    import httpx
+    client = httpx.AsyncClient(
+        http2=importlib.util.find_spec("h2") is not None,
+        timeout=model_timeout(),
+        limits=httpx.Limits(**HTTP_LIMITS)
+    )
+
+    def close():
+        try:
+            asyncio.run_coroutine_threadsafe(client.aclose(), event_loop()).result(timeout=5)
+        except Exception as e:
+            logging.warning(f"Could not close the shared async HTTP client: {str(e)}")
+
+    atexit.register(close)
+    return client
+
+def pooled_sdk_clients(model_platform, api_key: str) -> dict:
+    """client/async_client kwargs on the shared pools, or {} for platforms CAMEL builds itself.
+
+    CAMEL uses prebuilt clients as is, so the timeout, retry count and base URL it
+    would have set are passed here the same way.
+    """
+    from camel.types import ModelPlatformType
+    client_kwargs = dict(
+        api_key=api_key,
+        timeout=model_timeout(),
+        max_retries=MODEL_MAX_RETRIES,
+    )
+    if model_platform == ModelPlatformType.OPENAI:
+        from openai import OpenAI, AsyncOpenAI
+        base_url = os.environ.get("OPENAI_API_BASE_URL")
+        return {
+            "client": OpenAI(base_url=base_url, http_client=shared_http_client(), **client_kwargs),
+            "async_client": AsyncOpenAI(base_url=base_url, http_client=shared_async_http_client(), **client_kwargs),
+        }
+    if model_platform == ModelPlatformType.ANTHROPIC:
+        from anthropic import Anthropic, AsyncAnthropic
+        base_url = os.environ.get("ANTHROPIC_API_BASE_URL")
+        return {
+            "client": Anthropic(base_url=base_url, http_client=shared_http_client(), **client_kwargs),
+            "async_client": AsyncAnthropic(base_url=base_url, http_client=shared_async_http_client(), **client_kwargs),
+        }
+    return {}
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def create_model(model_platform, model_type, model_config_dict, api_key_env_var: str, api_key_fingerprint: str):
+    """ModelFactory.create, cached so repeat agent creations reuse the model client.
+
+    Only a fingerprint of the API key is part of the cache key; the key itself is
+    read from the environment here. A changed key gives a new fingerprint and a new model.
+    """
+    from camel.models import ModelFactory
+    api_key = os.getenv(api_key_env_var)
+    factory_params = inspect.signature(ModelFactory.create).parameters
+    # Older CAMEL releases can't take prebuilt clients or a retry count
+    extra_kwargs = {
+        name: client
+        for name, client in pooled_sdk_clients(model_platform, api_key).items()
+        if name in factory_params
+    }
+    if "max_retries" in factory_params:
+        extra_kwargs["max_retries"] = MODEL_MAX_RETRIES
+    return ModelFactory.create(
+        model_platform=model_platform,
+        model_type=model_type,
+        model_config_dict=model_config_dict,
+        api_key=api_key,
+        **extra_kwargs
+    )